@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+import numpy as np
+
+from section_surface import SectionJob, evaluate_section_grid, section_parameters
+
+
+def _chord_errors(job, us, vs):
+    """ Chord height of every u interval and every v interval of the grid us x vs.
+
+    The error of an interval is the largest distance, over all grid lines
+    crossing it, between the surface at its midpoint and the straight edge
+    the mesh puts there.
+
+    The midpoints are evaluated interleaved with the grid lines rather than
+    on their own, so the engines still see the u = 0/1 and v = 0/1 ends they
+    anchor the surface on (as evaluate_section_rows pads its rows).
+    """
+    def interleave(ts):
+        both = np.empty(2 * len(ts) - 1)
+        both[0::2] = ts
+        both[1::2] = 0.5 * (ts[:-1] + ts[1:])
+        return both
+
+    fine_u = evaluate_section_grid(job, interleave(us), vs).reshape(2 * len(us) - 1, len(vs), 3)
+    fine_v = evaluate_section_grid(job, us, interleave(vs)).reshape(len(us), 2 * len(vs) - 1, 3)
+    grid = fine_u[0::2]
+    along_u = fine_u[1::2]
+    along_v = fine_v[:, 1::2]
+
+    u_errors = np.linalg.norm(along_u - 0.5 * (grid[:-1] + grid[1:]), axis=2).max(axis=1)
+    v_errors = np.linalg.norm(along_v - 0.5 * (grid[:, :-1] + grid[:, 1:]), axis=2).max(axis=0)
+    return u_errors, v_errors
+
+
+def _split(ts, errors, tolerance, max_count):
+    """ Insert the midpoint of every interval over tolerance, worst first while under max_count. """
+    over = np.flatnonzero(errors > tolerance)
+    room = max_count - len(ts)
+    if room <= 0 or len(over) == 0:
+        return ts
+    if len(over) > room:
+        over = over[np.argsort(errors[over])[::-1][:room]]
+    return np.sort(np.concatenate((ts, 0.5 * (ts[over] + ts[over + 1]))))
+
+
+def refine_section_job(job, tolerance, initial_resolution=(3, 3), max_resolution=(129, 129), max_passes=16):
+    """ Place a section's grid lines where its surface bends instead of evenly.
+
+    Starting from a coarse grid, every u and v interval whose chord height is
+    over tolerance (blender units) is halved, until all are within it or
+    max_resolution is reached. The grid stays a tensor product, so the result
+    meshes with PatchMesher like any other job, just with far fewer lines
+    across flat areas and more around tight bends.
+
+    Returns:
+        A copy of job with explicit us and vs.
+    """
+    us = np.linspace(0.0, 1.0, initial_resolution[0])
+    vs = np.linspace(0.0, 1.0, initial_resolution[1])
+    for _ in range(max_passes):
+        u_errors, v_errors = _chord_errors(job, us, vs)
+        next_us = _split(us, u_errors, tolerance, max_resolution[0])
+        next_vs = _split(vs, v_errors, tolerance, max_resolution[1])
+        if len(next_us) == len(us) and len(next_vs) == len(vs):
+            break
+        us, vs = next_us, next_vs
+
+    return SectionJob(job.left, job.right, job.top, job.bottom,
+                      job.left_range, job.right_range, job.top_range, job.bottom_range,
+                      engine=job.engine, us=us, vs=vs)
+
+
+def _merge_parameters(parameter_sets, tolerance=1e-9):
+    ts = np.sort(np.concatenate(parameter_sets))
+    keep = np.ones(len(ts), dtype=bool)
+    keep[1:] = np.diff(ts) > tolerance
+    ts = ts[keep]
+    ts[0], ts[-1] = 0.0, 1.0
+    return ts
+
+
+def conform_shared_boundaries(jobs):
+    """ Give sections meshed along a shared boundary curve the same grid lines across it.
+
+    Two sections that refined independently sample their common boundary at
+    different points, which leaves cracks welding cannot close. Sections are
+    linked wherever they use the same span of the same curve (in either
+    direction), and every linked chain of u or v axes gets the union of their
+    parameters. Returns new jobs, in order.
+    """
+    # (job index, axis) -> [(linked (job index, axis), reversed)], axis 0 runs along bottom/top, 1 along left/right
+    spans = defaultdict(list)
+    for index, job in enumerate(jobs):
+        for axis, boundaries in ((0, ((job.bottom, job.bottom_range), (job.top, job.top_range))),
+                                 (1, ((job.left, job.left_range), (job.right, job.right_range)))):
+            for curve, (start, end) in boundaries:
+                spans[(curve.name, min(start, end), max(start, end))].append(((index, axis), start > end))
+
+    links = defaultdict(list)
+    for users in spans.values():
+        (first, first_reversed) = users[0]
+        for node, reversed_span in users[1:]:
+            links[first].append((node, first_reversed != reversed_span))
+            links[node].append((first, first_reversed != reversed_span))
+
+    parameters = [list(section_parameters(job)) for job in jobs]
+    visited = set()
+    for start in ((index, axis) for index in range(len(jobs)) for axis in (0, 1)):
+        if start in visited:
+            continue
+        # Walk the chain, tracking whether each axis runs against the first one
+        chain, stack = [], [(start, False)]
+        visited.add(start)
+        while stack:
+            node, flipped = stack.pop()
+            chain.append((node, flipped))
+            for neighbour, reverses in links[node]:
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    stack.append((neighbour, flipped != reverses))
+        if len(chain) == 1:
+            continue
+
+        merged = _merge_parameters([1.0 - parameters[i][axis][::-1] if flipped else parameters[i][axis]
+                                    for (i, axis), flipped in chain])
+        for (i, axis), flipped in chain:
+            parameters[i][axis] = 1.0 - merged[::-1] if flipped else merged
+
+    return [SectionJob(job.left, job.right, job.top, job.bottom,
+                       job.left_range, job.right_range, job.top_range, job.bottom_range,
+                       engine=job.engine, us=us, vs=vs)
+            for job, (us, vs) in zip(jobs, parameters)]
@@ -1,74 +1,85 @@
 import numpy as np
-import mathutils
 from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableSet, Reversible, Set as AbstractSet, Sized
 
-def transform_points_from_BY_to_AZ(B : np.ndarray, Y : np.ndarray, A : np.ndarray, Z : np.ndarray, points : Iterable[np.ndarray]):
-
-    # # Coordinates of the original segment
-    # B = np.array([x_B, y_B, z_B])
-    # Y = np.array([x_Y, y_Y, z_Y])
+# Segments shorter than this, or this close to antiparallel, take the degenerate paths
+EPSILON = 1e-12
 
-    # # Coordinates of the target segment
-    # A = np.array([x_A, y_A, z_A])
-    # Z = np.array([x_Z, y_Z, z_Z])
+def affine_from_BY_to_AZ(B : np.ndarray, Y : np.ndarray, A : np.ndarray, Z : np.ndarray):
+    """ Rotation+scale matrices and offsets that carry segment BY onto segment AZ.
 
+    B, Y, A and Z are (3,) or stacked (K, 3). Returns (M, offset) with M (K, 3, 3)
+    and offset (K, 3) such that P' = M @ P + offset.
+    """
+    B, Y, A, Z = (np.atleast_2d(np.asarray(v, dtype=np.float64)) for v in (B, Y, A, Z))
 
     # Direction vectors
     v1 = Y - B
     v2 = Z - A
 
     # Lengths of the segments
-    L1 = np.linalg.norm(v1)
-    L2 = np.linalg.norm(v2)
-
+    L1 = np.linalg.norm(v1, axis=-1)
+    L2 = np.linalg.norm(v2, axis=-1)
+    degenerate = (L1 < EPSILON) | (L2 < EPSILON)
 
     # Unit vectors
-    u1 = v1 / L1
-    u2 = v2 / L2
+    u1 = v1 / np.where(L1 < EPSILON, 1.0, L1)[:, None]
+    u2 = v2 / np.where(L2 < EPSILON, 1.0, L2)[:, None]
 
     # Compute the cross product and dot product
     cross_prod = np.cross(u1, u2)
-    dot_prod = np.dot(u1, u2)
-
-    # Skew-symmetric cross-product matrix
-    K = np.array([
-        [0, -cross_prod[2], cross_prod[1]],
-        [cross_prod[2], 0, -cross_prod[0]],
-        [-cross_prod[1], cross_prod[0], 0]
-    ])
-
-    # Rotation matrix using Rodrigues' rotation formula
-    I = np.eye(3)
-    R = I + K + K @ K * ((1 - dot_prod) / (np.linalg.norm(cross_prod) ** 2))
-
+    dot_prod = np.einsum('kd,kd->k', u1, u2)
+
+    # Skew-symmetric cross-product matrices
+    K = np.zeros((len(cross_prod), 3, 3))
+    K[:, 0, 1] = -cross_prod[:, 2]
+    K[:, 0, 2] = cross_prod[:, 1]
+    K[:, 1, 0] = cross_prod[:, 2]
+    K[:, 1, 2] = -cross_prod[:, 0]
+    K[:, 2, 0] = -cross_prod[:, 1]
+    K[:, 2, 1] = cross_prod[:, 0]
+
+    # Rodrigues' rotation formula, with (1 - cos) / sin^2 written as 1 / (1 + cos)
+    # so parallel segments give the identity instead of 0 / 0
+    antiparallel = dot_prod < -1.0 + EPSILON
+    factor = 1.0 / np.where(antiparallel, 1.0, 1.0 + dot_prod)
+    R = np.eye(3) + K + (K @ K) * factor[:, None, None]
+
+    # Antiparallel segments: half turn about any axis perpendicular to u1
+    if np.any(antiparallel):
+        u = u1[antiparallel]
+        helper = np.eye(3)[np.argmin(np.abs(u), axis=-1)]
+        axis = np.cross(u, helper)
+        axis /= np.linalg.norm(axis, axis=-1)[:, None]
+        R[antiparallel] = 2.0 * axis[:, :, None] * axis[:, None, :] - np.eye(3)
+
+    # Zero length segments have no direction to match, only translate them
+    R[degenerate] = np.eye(3)
 
     # Scaling factor
-    s = L2 / L1
-
+    s = np.where(L1 < EPSILON, 1.0, L2 / np.where(L1 < EPSILON, 1.0, L1))
 
     # Combined rotation and scaling matrix
-    M = s * R
-
-    # Affine transformation matrix in homogeneous coordinates
-    affine_matrix = np.eye(4)
-    affine_matrix[:3, :3] = M
-    affine_matrix[:3, 3] = A - M @ B
+    M = s[:, None, None] * R
+    offset = A - np.einsum('kij,kj->ki', M, B)
+    return M, offset
 
 
-    transformed_points = []
-    for P in points:
-        # Convert P to homogeneous coordinates
-        P_homogeneous = np.append(P, 1)
-
-        # Apply the affine transformation
-        P_transformed_homogeneous = affine_matrix @ P_homogeneous
+def transform_points_from_BY_to_AZ(B : np.ndarray, Y : np.ndarray, A : np.ndarray, Z : np.ndarray, points : Iterable[np.ndarray]):
+    """ Rotate and scale points so segment BY lands on segment AZ.
 
-        # Convert back to Cartesian coordinates
-        P_transformed = P_transformed_homogeneous[:3]
+    With single (3,) segments points is (N, 3) and an (N, 3) array comes back.
+    With stacked (K, 3) segments points is (K, N, 3), every stack is moved by
+    its own transform in one einsum and a (K, N, 3) array comes back.
+    """
+    single = np.ndim(B) == 1
+    points = np.asarray(points, dtype=np.float64)
+    if single:
+        points = points[None]
 
-        transformed_points.append(P_transformed)
+    M, offset = affine_from_BY_to_AZ(B, Y, A, Z)
+    transformed_points = np.einsum('kij,knj->kni', M, points) + offset[:, None, :]
 
-    return transformed_points
+    return transformed_points[0] if single else transformed_points
 
 
 
@@ -0,0 +1,188 @@
+""" Benchmarks for the curve, intersection and sectioning hot paths.
+
+Runs headless: synthetic SnapshotCurve objects stand in for blender curve
+objects and are served through curve_utils.get_curve_object, so neither
+bpy nor mathutils is needed.
+
+    python benchmark_curves.py                 compare against the baselines, exit 1 on a regression
+    python benchmark_curves.py --record        time everything and overwrite the baselines
+
+Baselines are wall times from one machine; record them again when moving to
+a different one.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+import curve_utils
+from affine_transform import transform_points_from_BY_to_AZ
+from closest_pairs import closest_pair
+from composite_bezier import clear_composite_cache, get_composite_curve
+from curve_projection import SegmentBVH
+from curve_snapshot import SnapshotCurve, SnapshotSpline
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+
+def make_synthetic_curve(name, points, location=(0.0, 0.0, 0.0)):
+    """ A SnapshotCurve through points, with Catmull-Rom style handles. """
+    points = np.asarray(points, dtype=np.float32)
+    tangents = np.gradient(points, axis=0) / 3.0
+    spline = SnapshotSpline(points, points - tangents, points + tangents)
+    return SnapshotCurve(name, location, [spline])
+
+
+def make_curve_grid(rows, columns, points_per_curve, seed=0):
+    """ rows wavy horizontal curves crossed by columns wavy vertical ones, all in z = 0.
+
+    Returns (curves by name, list of (left, right, top, bottom) name tuples,
+    one per grid cell).
+    """
+    rng = np.random.default_rng(seed)
+    ts = np.linspace(-0.5, 1.5, points_per_curve)
+    curves = {}
+    for i in range(rows):
+        phase = rng.uniform(0, np.pi)
+        points = np.stack([ts * columns, i + 0.1 * np.sin(3 * ts + phase), np.zeros_like(ts)], axis=1)
+        curves[f"H.{i:03d}"] = make_synthetic_curve(f"H.{i:03d}", points)
+    for j in range(columns):
+        phase = rng.uniform(0, np.pi)
+        points = np.stack([j + 0.5 + 0.1 * np.sin(3 * ts + phase), ts * rows, np.zeros_like(ts)], axis=1)
+        curves[f"V.{j:03d}"] = make_synthetic_curve(f"V.{j:03d}", points)
+
+    sections = [(f"V.{j:03d}", f"V.{j + 1:03d}", f"H.{i + 1:03d}", f"H.{i:03d}")
+                for i in range(rows - 1) for j in range(columns - 1)]
+    return curves, sections
+
+
+def best_time(function, repeat=7, number=1):
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def cold(function):
+    """ Wrap a benchmark so compiled curves and cached corners are rebuilt every run. """
+    def run():
+        clear_composite_cache()
+        curve_utils.corner_intersections.clear()
+        function()
+    return run
+
+
+def benchmark_sample_blender_curve(results):
+    for points in (4, 16, 64):
+        curve = make_synthetic_curve("Sample", np.stack([np.linspace(0, 10, points), np.sin(np.linspace(0, 6, points)), np.zeros(points)], axis=1))
+        ts = np.linspace(0.0, 1.0, 100)
+        results[f"sample_blender_curve/{points}pts/100calls"] = best_time(lambda: [curve_utils.sample_blender_curve(curve, t) for t in ts])
+        results[f"sample_blender_curve_many/{points}pts/10000"] = best_time(lambda: curve_utils.sample_blender_curve_many(curve, np.linspace(0.0, 1.0, 10000)))
+
+
+def benchmark_get_curve_intersection(results):
+    for points in (4, 16, 64):
+        curves, _ = make_curve_grid(2, 2, points)
+        curveA, curveB = curves["H.000"], curves["V.000"]
+        results[f"get_curve_intersection/{points}pts"] = best_time(cold(lambda: curve_utils.get_curve_intersection(curveA, curveB)))
+
+
+def benchmark_get_curve_section_points(results):
+    curves, sections = make_curve_grid(3, 3, 8)
+    curve_utils.snapshot_curves = curves
+    get = curve_utils.get_curve_object
+    for resolution in (15, 50, 200):
+        def run():
+            for left, right, top, bottom in sections:
+                curve_utils.get_curve_section_points(get(left), get(right), get(top), get(bottom), (resolution, resolution))
+        results[f"get_curve_section_points/{len(sections)}sections/{resolution}x{resolution}"] = best_time(cold(run))
+    curve_utils.snapshot_curves = None
+
+
+def benchmark_transform_points(results):
+    rng = np.random.default_rng(0)
+    for columns, points in ((15, 15), (100, 100), (1000, 1000)):
+        B, Y, A, Z = rng.normal(size=(4, columns, 3))
+        stack = rng.normal(size=(columns, points, 3))
+        results[f"transform_points_from_BY_to_AZ/{columns}x{points}"] = best_time(lambda: transform_points_from_BY_to_AZ(B, Y, A, Z, stack))
+
+
+def benchmark_closest_pair(results):
+    rng = np.random.default_rng(0)
+    for size in (1000, 10000, 100000):
+        set1 = rng.random((size, 3))
+        set2 = rng.random((size, 3)) + 0.5
+        results[f"find_closest_pair/{size}x{size}"] = best_time(lambda: closest_pair(set1, set2), repeat=3)
+
+
+def benchmark_closest_points_on_curve(results):
+    rng = np.random.default_rng(0)
+    for points in (16, 200):
+        ts = np.linspace(0.0, 1.0, points)
+        curve = get_composite_curve(make_synthetic_curve("Project", np.stack([10 * ts, np.sin(12 * ts), np.cos(7 * ts)], axis=1)))
+        queries = curve.evaluate_many(rng.random(10000)) + rng.normal(scale=0.01, size=(10000, 3))
+        bvh = SegmentBVH(curve)
+        results[f"closest_points_on_curve/{points}pts/10000"] = best_time(lambda: bvh.closest_points(queries), repeat=3)
+
+
+BENCHMARKS = [
+    benchmark_sample_blender_curve,
+    benchmark_get_curve_intersection,
+    benchmark_get_curve_section_points,
+    benchmark_transform_points,
+    benchmark_closest_pair,
+    benchmark_closest_points_on_curve,
+]
+
+
+def run_benchmarks():
+    results = {}
+    for benchmark in BENCHMARKS:
+        benchmark(results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="overwrite the baselines with this run")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline json file")
+    parser.add_argument("--max-slowdown", type=float, default=2.0, help="fail when a benchmark is this many times slower than its baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks()
+
+    if args.record:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+            f.write("\n")
+        for name, seconds in sorted(results.items()):
+            print(f"{name:60s} {seconds * 1000:10.3f} ms")
+        print(f"Recorded {len(results)} baselines to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baselines = json.load(f)
+
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:60s} {seconds * 1000:10.3f} ms   (no baseline)")
+            continue
+        ratio = seconds / baseline
+        flag = "  REGRESSION" if ratio > args.max_slowdown else ""
+        print(f"{name:60s} {seconds * 1000:10.3f} ms   x{ratio:5.2f} of {baseline * 1000:.3f} ms{flag}")
+        if flag:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than {args.max_slowdown}x their baseline:")
+        for name in regressions:
+            print(f"  {name}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
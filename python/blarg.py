@@ -1,65 +1,25 @@
 import bpy
 import mathutils
 
+from closest_pairs import closest_pair
+from composite_bezier import get_composite_curve
+
 def curve_to_points_via_length(curve_obj_name, length):
-    
-    curve_obj = bpy.data.objects.get(curve_obj_name)
     """
     Resamples the given curve object into points spaced by the specified segment length.
 
+    Works straight on the bezier control points, nothing is added to the scene
+    and the depsgraph is not evaluated.
+
     Parameters:
-        curve_obj (bpy.types.Object): The curve object to resample.
-        segment_length (float): The desired length between resampled points.
+        curve_obj_name (str): Name of the curve object to resample.
+        length (float): The desired length between resampled points.
 
     Returns:
-        list of mathutils.Vector: A list of vectors representing the resampled points.
+        np.ndarray: (N, 3) array of the resampled points in object space.
     """
-    # Add a Geometry Nodes modifier
-    geo_mod = curve_obj.modifiers.new(name="ResampleCurve", type='NODES')
-
-    group = geo_mod.node_group = bpy.data.node_groups.new('ResampleCurveGroup', 'GeometryNodeTree')
-
-    group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
-    input_node = group.nodes.new('NodeGroupInput')
-    input_node.select = False
-    input_node.location.x = -200 - input_node.width
-
-    group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
-    output_node = group.nodes.new('NodeGroupOutput')
-    output_node.is_active_output = True
-    output_node.select = False
-    output_node.location.x = 200
-    
-    group.links.new(group.nodes["Group Input"].outputs[0], group.nodes["Group Output"].inputs[0])
-
-
-
-    # Add a Resample Curve node
-    resample_node = group.nodes.new(type='GeometryNodeResampleCurve')
-    resample_node.mode = 'LENGTH'  # Set mode to 'Length'
-    resample_node.inputs['Length'].default_value = length  # Set desired length between points
-
-
-    group.links.new(input_node.outputs[0], resample_node.inputs[0])  # Connect 'Geometry' output to 'Curve' input
-    group.links.new(resample_node.outputs[0], output_node.inputs[0])  # Connect 'Curve' output to 'Geometry' input
-
-    # Apply the modifier to evaluate the geometry
-    bpy.context.view_layer.update()
-
-    # Access the evaluated mesh
-    depsgraph = bpy.context.evaluated_depsgraph_get()
-    eval_obj = curve_obj.evaluated_get(depsgraph)
-    mesh = eval_obj.to_mesh()
-
-    # Retrieve the sampled points
-    sampled_points = [v.co for v in mesh.vertices]
-
-    # Clean up
-    eval_obj.to_mesh_clear()
-
-    curve_obj.modifiers.remove(geo_mod)
-
-    return sampled_points
+    curve_obj = bpy.data.objects.get(curve_obj_name)
+    return get_composite_curve(curve_obj).resample_by_length(length)
 
 
 
@@ -68,18 +28,12 @@ def curve_to_points_via_length(curve_obj_name, length):
 
 def find_closest_pair(set1, set2):
     """ Find the closest pair of points between two sets. """
-    min_distance = float('inf')
-    closest_pair = (None, None)
-
-    for v1 in set1:
-        for v2 in set2:
-            distance = (v2 - v1).length
-            print(f"{distance}")
-            if distance < min_distance:
-                min_distance = distance
-                closest_pair = (v1, v2)
+    index1, index2, distance = closest_pair(set1, set2)
+    if index1 is None:
+        return (None, None)
 
-    return closest_pair
+    print(f"Closest distance: {distance}")
+    return (set1[index1], set2[index2])
 
 def create_visualization(point1, point2):
     """ Create an object to visualize the closest points and a line connecting them. """
@@ -108,9 +62,9 @@ def create_visualization(point1, point2):
 point_set1 = curve_to_points_via_length("GraphTest.001", 0.75)
 point_set2 = curve_to_points_via_length("GraphTest.008", 0.75)
 
-if point_set1 and point_set2:
+if len(point_set1) and len(point_set2):
     closest_points = find_closest_pair(point_set1, point_set2)
-    if closest_points[0] and closest_points[1]:
+    if closest_points[0] is not None and closest_points[1] is not None:
         create_visualization(*closest_points)
         print(f"Closest points found: {closest_points[0]} and {closest_points[1]}")
     else:
@@ -0,0 +1,56 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _as_points(points):
+    return np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
+
+def closest_pair(set1, set2):
+    """ Find the closest pair of points between two point sets.
+
+    A KD-tree is built over the larger set and queried with the smaller one,
+    so this is O((n + m) log n) instead of comparing every pair.
+
+    Returns:
+        (index into set1, index into set2, distance), or (None, None, inf) if a set is empty.
+    """
+    indices1, indices2, distances = k_nearest_pairs(set1, set2, 1)
+    if len(distances) == 0:
+        return None, None, float('inf')
+    return int(indices1[0]), int(indices2[0]), float(distances[0])
+
+
+def k_nearest_pairs(set1, set2, k):
+    """ The k closest (set1, set2) point pairs, nearest first.
+
+    Every one of the k globally closest pairs is among the k nearest
+    neighbours of its set1 point, so querying k neighbours per point and
+    keeping the k best candidates is exact.
+
+    Returns:
+        (indices into set1, indices into set2, distances), each of length <= k.
+    """
+    points1 = _as_points(set1)
+    points2 = _as_points(set2)
+    if len(points1) == 0 or len(points2) == 0 or k <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64)
+
+    # Build the tree over the larger set, query with the smaller one
+    swap = len(points1) > len(points2)
+    tree_points, query_points = (points1, points2) if swap else (points2, points1)
+
+    neighbours = min(k, len(tree_points))
+    distances, tree_indices = cKDTree(tree_points).query(query_points, k=neighbours)
+    distances = distances.reshape(len(query_points), neighbours).ravel()
+    tree_indices = tree_indices.reshape(len(query_points), neighbours).ravel()
+    query_indices = np.repeat(np.arange(len(query_points)), neighbours)
+
+    count = min(k, len(distances))
+    best = np.argpartition(distances, count - 1)[:count]
+    best = best[np.argsort(distances[best], kind='stable')]
+
+    if swap:
+        return tree_indices[best], query_indices[best], distances[best]
+    return query_indices[best], tree_indices[best], distances[best]
@@ -0,0 +1,349 @@
+import bisect
+import hashlib
+
+import numpy as np
+
+from pipeline_stats import stats
+
+
+# Each segment's arc length is integrated piecewise over this many equal steps of t
+ARC_LENGTH_SUBDIVISIONS = 16
+_GAUSS_NODES, _GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(8)
+
+# Parameter grids evaluated over and over (quadrature nodes, section rows) keep their basis matrices
+BASIS_CACHE_SIZE = 64
+# Grids larger than this many parameters are not worth keeping around
+BASIS_CACHE_MAX_POINTS = 1 << 16
+
+
+def get_spline_control_points(curve_obj, all_splines=False):
+    """ Pull the bezier control points of a curve object into flat numpy arrays.
+
+    Uses foreach_get so the points are copied in one go instead of walking
+    bezier_points attribute by attribute.
+
+    Returns:
+        (co, handle_left, handle_right) arrays, each (N, 3) float64.
+    """
+    splines = []
+    for spline in curve_obj.data.splines:
+        if spline.type != 'BEZIER':
+            continue
+        if all_splines:
+            splines.append(spline)
+        elif not splines or len(spline.bezier_points) > len(splines[0].bezier_points):
+            splines = [spline]
+
+    co, handle_left, handle_right = [], [], []
+    for spline in splines:
+        count = len(spline.bezier_points)
+        for attr, out in (("co", co), ("handle_left", handle_left), ("handle_right", handle_right)):
+            flat = np.empty(count * 3, dtype=np.float32)
+            spline.bezier_points.foreach_get(attr, flat)
+            out.append(flat.reshape(count, 3))
+
+    if not co:
+        empty = np.empty((0, 3), dtype=np.float64)
+        return empty, empty, empty
+    return (np.concatenate(co).astype(np.float64),
+            np.concatenate(handle_left).astype(np.float64),
+            np.concatenate(handle_right).astype(np.float64))
+
+
+def control_point_hash(co, handle_left, handle_right, location=None):
+    """ Content hash of a curve's control points, used to spot edits. """
+    digest = hashlib.blake2b(digest_size=16)
+    for arr in (co, handle_left, handle_right):
+        digest.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    if location is not None:
+        digest.update(np.asarray(location, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class CompositeBezier:
+    """ A chain of cubic bezier segments compiled once from a blender curve.
+
+    Holds the segment control points, the per segment lengths and a cumulative
+    length array so a global parameter t can be mapped to a segment by
+    bisection instead of rebuilding every segment on each sample.
+
+    Inside a segment t is mapped through a precomputed inverse arc length
+    table (Hermite interpolated), so equal steps in t are equal steps in length along the curve.
+    """
+
+    def __init__(self, co, handle_left, handle_right, location=(0.0, 0.0, 0.0), name=None,
+                 table_samples=32, newton_steps=3):
+        co = np.asarray(co, dtype=np.float64)
+        handle_left = np.asarray(handle_left, dtype=np.float64)
+        handle_right = np.asarray(handle_right, dtype=np.float64)
+
+        self.name = name
+        self.location = np.asarray(location, dtype=np.float64).reshape(3)
+        self.hash = control_point_hash(co, handle_left, handle_right, self.location)
+
+        # (S, 4, 3) control points, one row of four per segment
+        self.segments = np.stack([co[:-1], handle_right[:-1], handle_left[1:], co[1:]], axis=1)
+
+        # global parameter grid bytes -> (segment indices, Bernstein basis) from evaluate_many
+        self._grid_cache = {}
+
+        self._build_arc_length_table(table_samples, newton_steps)
+
+        # cumulative_lengths[i] is the arc length at the start of segment i
+        self.cumulative_lengths = np.concatenate(([0.0], np.cumsum(self.lengths)))
+        self.total_length = float(self.cumulative_lengths[-1])
+
+    @classmethod
+    def from_blender_curve(cls, curve_obj, all_splines=False):
+        co, handle_left, handle_right = get_spline_control_points(curve_obj, all_splines)
+        location = (curve_obj.location.x, curve_obj.location.y, curve_obj.location.z)
+        return cls(co, handle_left, handle_right, location, name=curve_obj.name)
+
+    @property
+    def segment_count(self):
+        return len(self.segments)
+
+    def __getstate__(self):
+        # the basis cache can hold many large grids, jobs sent to worker processes go without it
+        state = self.__dict__.copy()
+        state["_grid_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._grid_cache = {}
+
+    def _build_arc_length_table(self, table_samples, newton_steps):
+        """ Tabulate local t at evenly spaced arc lengths for every segment.
+
+        Lengths come from Gauss-Legendre quadrature over ARC_LENGTH_SUBDIVISIONS
+        pieces of each segment. The inverse is seeded by interpolating that grid
+        and polished with a few Newton steps (d length / d t is the speed).
+        """
+        segment_count = len(self.segments)
+        subdivisions = ARC_LENGTH_SUBDIVISIONS
+
+        # Quadrature over every sub interval [k/K, (k+1)/K] of every segment, the same nodes for every curve
+        starts = np.arange(subdivisions) / subdivisions
+        nodes = starts[:, None] + (_GAUSS_NODES[None, :] + 1.0) * (0.5 / subdivisions)
+        speeds = np.linalg.norm(self.evaluate_segments(nodes.ravel(), derivative=1), axis=-1)
+        speeds = speeds.reshape(segment_count, subdivisions, len(_GAUSS_NODES))
+        pieces = speeds @ _GAUSS_WEIGHTS * (0.5 / subdivisions)
+        self._length_grid = np.concatenate((np.zeros((segment_count, 1)), np.cumsum(pieces, axis=1)), axis=1)
+        self.lengths = self._length_grid[:, -1].copy()
+
+        fractions = np.linspace(0.0, 1.0, table_samples + 1)
+        targets = fractions[None, :] * self.lengths[:, None]
+        grid_ts = np.linspace(0.0, 1.0, subdivisions + 1)
+        local_ts = np.empty_like(targets)
+        for i in range(segment_count):
+            local_ts[i] = np.interp(targets[i], self._length_grid[i], grid_ts)
+
+        indices = np.repeat(np.arange(segment_count), table_samples + 1)
+        flat_targets = targets.ravel()
+        flat_ts = local_ts.ravel()
+        for _ in range(newton_steps):
+            error = self.segment_arc_length(indices, flat_ts) - flat_targets
+            speed = np.linalg.norm(bezier_derivative(self.segments[indices], flat_ts), axis=-1)
+            step = np.divide(error, speed, out=np.zeros_like(error), where=speed > 1e-12)
+            flat_ts = np.clip(flat_ts - step, 0.0, 1.0)
+
+        self._table_ts = flat_ts.reshape(segment_count, table_samples + 1)
+        self._table_ts[:, 0] = 0.0
+        self._table_ts[:, -1] = 1.0
+        self._table_samples = table_samples
+
+        # d t / d (length fraction) at every table node, for Hermite interpolation
+        speed = np.linalg.norm(bezier_derivative(self.segments[indices], self._table_ts.ravel()), axis=-1)
+        slopes = np.divide(np.repeat(self.lengths, table_samples + 1) / table_samples, speed,
+                           out=np.full_like(speed, 1.0 / table_samples), where=speed > 1e-12)
+        self._table_slopes = slopes.reshape(segment_count, table_samples + 1)
+
+    def segment_arc_length(self, indices, local_ts):
+        """ Arc length from the start of each given segment up to local_ts. """
+        indices = np.asarray(indices)
+        local_ts = np.asarray(local_ts, dtype=np.float64)
+        subdivisions = ARC_LENGTH_SUBDIVISIONS
+        pieces = np.minimum((local_ts * subdivisions).astype(np.int64), subdivisions - 1)
+        starts = pieces / subdivisions
+        half = 0.5 * (local_ts - starts)
+        nodes = starts[..., None] + half[..., None] * (_GAUSS_NODES + 1.0)
+        speeds = np.linalg.norm(bezier_derivative(self.segments[indices][..., None, :, :], nodes), axis=-1)
+        return self._length_grid[indices, pieces] + half * (speeds @ _GAUSS_WEIGHTS)
+
+    def parameter_at(self, indices, local_ts):
+        """ Global arc length parameter t for points given as (segment index, local t). """
+        if self.total_length <= 0.0:
+            return np.zeros(np.shape(local_ts))
+        indices = np.asarray(indices)
+        return (self.cumulative_lengths[indices] + self.segment_arc_length(indices, local_ts)) / self.total_length
+
+    def _local_t_from_length(self, indices, local_lengths):
+        lengths = self.lengths[indices]
+        fractions = np.divide(local_lengths, lengths, out=np.ones_like(local_lengths), where=lengths > 0.0)
+        positions = np.clip(fractions, 0.0, 1.0) * self._table_samples
+        rows = np.minimum(positions.astype(np.int64), self._table_samples - 1)
+        w = positions - rows
+        w2 = w * w
+        w3 = w2 * w
+        return ((2.0 * w3 - 3.0 * w2 + 1.0) * self._table_ts[indices, rows]
+                + (w3 - 2.0 * w2 + w) * self._table_slopes[indices, rows]
+                + (-2.0 * w3 + 3.0 * w2) * self._table_ts[indices, rows + 1]
+                + (w3 - w2) * self._table_slopes[indices, rows + 1])
+
+    def locate(self, t):
+        """ Map a global parameter t to (segment index, local t) by bisection. """
+        assert 0.0 <= t <= 1.0, "Parameter t must be in [0, 1]"
+        target_length = t * self.total_length
+        index = bisect.bisect_left(self.cumulative_lengths, target_length, 1, len(self.cumulative_lengths) - 1) - 1
+        local_t = self._local_t_from_length(np.array([index]), np.array([target_length - self.cumulative_lengths[index]]))
+        return index, float(local_t[0])
+
+    def evaluate(self, t):
+        """ Evaluate a point on the composite curve at parameter t (object space). """
+        stats.count("curve evaluations")
+        index, local_t = self.locate(t)
+        p0, p1, p2, p3 = self.segments[index]
+        mt = 1.0 - local_t
+        return (mt * mt * mt) * p0 + (3.0 * mt * mt * local_t) * p1 + (3.0 * mt * local_t * local_t) * p2 + (local_t * local_t * local_t) * p3
+
+    def locate_many(self, ts):
+        """ Vectorized locate: map an array of global parameters to segment indices and local t. """
+        ts = np.asarray(ts, dtype=np.float64)
+        assert np.all((ts >= 0.0) & (ts <= 1.0)), "Parameter t must be in [0, 1]"
+        target_lengths = ts * self.total_length
+        indices = np.searchsorted(self.cumulative_lengths[1:-1], target_lengths, side='left')
+        return indices, self._local_t_from_length(indices, target_lengths - self.cumulative_lengths[indices])
+
+    def evaluate_many(self, ts):
+        """ Evaluate the composite curve at an array of parameters in one numpy pass.
+
+        The segment lookup and Bernstein basis of small grids are cached on the
+        curve, so evaluating the same grid again is a single contraction.
+
+        Returns:
+            (N, 3) array of object space points.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        stats.count("curve evaluations", ts.size)
+        flat = ts.ravel()
+        key = flat.tobytes()
+        cached = self._grid_cache.get(key)
+        if cached is None:
+            indices, local_ts = self.locate_many(flat)
+            cached = (indices, bernstein_basis(local_ts))
+            if flat.size <= BASIS_CACHE_MAX_POINTS:
+                if len(self._grid_cache) >= BASIS_CACHE_SIZE:
+                    self._grid_cache.pop(next(iter(self._grid_cache)))
+                self._grid_cache[key] = cached
+        indices, basis = cached
+        points = np.einsum('nk,nkd->nd', basis, self.segments[indices])
+        return points.reshape(ts.shape + (3,))
+
+    def evaluate_segments(self, local_ts, derivative=0):
+        """ Every segment at the same local parameters, (S, N, 3), one matrix multiply.
+
+        derivative picks the point (0), first (1) or second (2) derivative.
+        """
+        return basis_matrix(local_ts, derivative) @ self.segments
+
+    def sample_uniform(self, count):
+        """ count points evenly spaced by arc length, start and end included. """
+        return self.evaluate_many(np.linspace(0.0, 1.0, count))
+
+    def resample_by_length(self, length):
+        """ Resample the curve into points evenly spaced by about length along the curve.
+
+        Like the Resample Curve node in length mode, the segment count is
+        rounded down so the spacing divides the curve evenly, end points included.
+
+        Returns:
+            (N, 3) array of object space points.
+        """
+        if length <= 0.0:
+            raise ValueError("Resample length must be positive")
+        count = max(int(self.total_length / length), 1) + 1
+        return self.sample_uniform(count)
+
+
+def bernstein_basis(ts):
+    """ Cubic Bernstein basis for an array of parameters, shape (N, 4). """
+    ts = np.asarray(ts, dtype=np.float64)
+    mt = 1.0 - ts
+    return np.stack([mt * mt * mt, 3.0 * mt * mt * ts, 3.0 * mt * ts * ts, ts * ts * ts], axis=-1)
+
+
+def bernstein_derivative_basis(ts, derivative):
+    """ Basis of the first or second derivative of a cubic, (N, 4) weights on its control points. """
+    ts = np.asarray(ts, dtype=np.float64)
+    mt = 1.0 - ts
+    if derivative == 1:
+        return 3.0 * np.stack([-mt * mt, mt * mt - 2.0 * mt * ts, 2.0 * mt * ts - ts * ts, ts * ts], axis=-1)
+    if derivative == 2:
+        return 6.0 * np.stack([mt, ts - 2.0 * mt, mt - 2.0 * ts, ts], axis=-1)
+    raise ValueError(f"Unsupported derivative {derivative}, expected 1 or 2")
+
+
+_basis_cache = {}
+
+
+def basis_matrix(ts, derivative=0):
+    """ Cached (N, 4) Bernstein (or derivative) basis of a parameter grid shared by many segments.
+
+    The returned array is read only, it is handed out again for the same grid.
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    key = (ts.tobytes(), derivative)
+    basis = _basis_cache.get(key)
+    if basis is None:
+        basis = bernstein_basis(ts) if derivative == 0 else bernstein_derivative_basis(ts, derivative)
+        basis.flags.writeable = False
+        if ts.size <= BASIS_CACHE_MAX_POINTS:
+            if len(_basis_cache) >= BASIS_CACHE_SIZE:
+                _basis_cache.pop(next(iter(_basis_cache)))
+            _basis_cache[key] = basis
+    return basis
+
+
+# Compiled curves keyed by object name, rebuilt when the control points change
+_composite_cache = {}
+
+
+def get_composite_curve(curve_obj, all_splines=False):
+    """ Return the cached CompositeBezier for a curve object, recompiling it if edited. """
+    co, handle_left, handle_right = get_spline_control_points(curve_obj, all_splines)
+    location = (curve_obj.location.x, curve_obj.location.y, curve_obj.location.z)
+    key = (curve_obj.name, all_splines)
+    content_hash = control_point_hash(co, handle_left, handle_right, np.asarray(location, dtype=np.float64))
+
+    cached = _composite_cache.get(key)
+    if cached is not None and cached.hash == content_hash:
+        return cached
+
+    with stats.stage("curve compile"):
+        composite = CompositeBezier(co, handle_left, handle_right, location, name=curve_obj.name)
+    stats.count("curve rebuilds")
+    stats.count("segment rebuilds", composite.segment_count)
+    _composite_cache[key] = composite
+    return composite
+
+
+def clear_composite_cache():
+    _composite_cache.clear()
+
+
+def bezier_derivative(nodes, ts):
+    """ First derivative of cubic segments. nodes is (..., 4, 3), ts broadcasts against (...). """
+    ts = np.asarray(ts, dtype=np.float64)[..., None]
+    mt = 1.0 - ts
+    return 3.0 * (mt * mt * (nodes[..., 1, :] - nodes[..., 0, :])
+                  + 2.0 * mt * ts * (nodes[..., 2, :] - nodes[..., 1, :])
+                  + ts * ts * (nodes[..., 3, :] - nodes[..., 2, :]))
+
+
+def bezier_second_derivative(nodes, ts):
+    """ Second derivative of cubic segments, same broadcasting as bezier_derivative. """
+    ts = np.asarray(ts, dtype=np.float64)[..., None]
+    mt = 1.0 - ts
+    return 6.0 * (mt * (nodes[..., 2, :] - 2.0 * nodes[..., 1, :] + nodes[..., 0, :])
+                  + ts * (nodes[..., 3, :] - 2.0 * nodes[..., 2, :] + nodes[..., 1, :]))
@@ -0,0 +1,455 @@
+import json
+import os
+
+import numpy as np
+
+from composite_bezier import CompositeBezier, bernstein_basis, bezier_derivative, bezier_second_derivative
+from pipeline_stats import stats
+
+
+class CurveIntersection:
+    """ A crossing (or closest approach) between two composite curves.
+
+    t and s are the global parameters on the first and second curve,
+    distance is the gap between the two curve points in world space and
+    point is the midpoint between them.
+    """
+
+    def __init__(self, t, s, distance, point):
+        self.t = float(t)
+        self.s = float(s)
+        self.distance = float(distance)
+        self.point = np.asarray(point, dtype=np.float64)
+
+    def swapped(self):
+        return CurveIntersection(self.s, self.t, self.distance, self.point)
+
+    def __repr__(self):
+        return f"CurveIntersection(t={self.t:.6f}, s={self.s:.6f}, distance={self.distance:.6g})"
+
+
+def split_cubic(nodes):
+    """ Split (..., 4, 3) cubic segments at t = 0.5 with de Casteljau, returns (left, right). """
+    p0, p1, p2, p3 = nodes[..., 0, :], nodes[..., 1, :], nodes[..., 2, :], nodes[..., 3, :]
+    p01 = 0.5 * (p0 + p1)
+    p12 = 0.5 * (p1 + p2)
+    p23 = 0.5 * (p2 + p3)
+    p012 = 0.5 * (p01 + p12)
+    p123 = 0.5 * (p12 + p23)
+    mid = 0.5 * (p012 + p123)
+    left = np.stack([p0, p01, p012, mid], axis=-2)
+    right = np.stack([mid, p123, p23, p3], axis=-2)
+    return left, right
+
+
+def _box_gap(nodesA, nodesB):
+    """ Lower bound on the distance between two cubics from their control polygon boxes. """
+    gap = np.maximum(nodesA.min(axis=-2) - nodesB.max(axis=-2), nodesB.min(axis=-2) - nodesA.max(axis=-2))
+    return np.linalg.norm(np.maximum(gap, 0.0), axis=-1)
+
+
+def _box_size(nodes):
+    return np.linalg.norm(nodes.max(axis=-2) - nodes.min(axis=-2), axis=-1)
+
+
+def _subdivide(curveA, curveB, tolerance, closest, max_depth, max_pairs):
+    """ Bounding box subdivision over every segment pair of two composite curves.
+
+    With closest=False pairs are kept while their boxes are within tolerance of
+    each other. With closest=True the threshold tightens to the best distance
+    seen so far (branch and bound), leaving only the global closest approach.
+
+    Returns seed (segment index, local t) arrays on both curves.
+    """
+    nodesA = curveA.segments + curveA.location
+    nodesB = curveB.segments + curveB.location
+    countA, countB = len(nodesA), len(nodesB)
+
+    segA = np.repeat(np.arange(countA), countB)
+    segB = np.tile(np.arange(countB), countA)
+    pairsA = nodesA[segA]
+    pairsB = nodesB[segB]
+    # parameter interval of every sub curve inside its segment
+    startA = np.zeros(len(segA))
+    startB = np.zeros(len(segB))
+    width = 1.0
+
+    best = np.inf
+    for _ in range(max_depth):
+        gap = _box_gap(pairsA, pairsB)
+        stats.count("box tests", len(gap))
+        if closest:
+            # segment end points lie on the curves, so they bound the closest distance from above
+            ends = np.linalg.norm(pairsA[:, [0, 0, 3, 3]] - pairsB[:, [0, 3, 0, 3]], axis=-1)
+            best = min(best, ends.min(initial=np.inf))
+            keep = gap <= best + tolerance
+        else:
+            keep = gap <= tolerance
+        if not np.any(keep):
+            break
+
+        pairsA, pairsB = pairsA[keep], pairsB[keep]
+        segA, segB = segA[keep], segB[keep]
+        startA, startB = startA[keep], startB[keep]
+        gap = gap[keep]
+
+        if len(gap) > max_pairs:
+            order = np.argsort(gap)[:max_pairs]
+            pairsA, pairsB = pairsA[order], pairsB[order]
+            segA, segB = segA[order], segB[order]
+            startA, startB = startA[order], startB[order]
+
+        if max(_box_size(pairsA).max(), _box_size(pairsB).max()) <= tolerance:
+            break
+
+        # split both sides, every kept pair becomes four
+        leftA, rightA = split_cubic(pairsA)
+        leftB, rightB = split_cubic(pairsB)
+        width *= 0.5
+        pairsA = np.concatenate([leftA, leftA, rightA, rightA])
+        pairsB = np.concatenate([leftB, rightB, leftB, rightB])
+        segA = np.tile(segA, 4)
+        segB = np.tile(segB, 4)
+        startA = np.concatenate([startA, startA, startA + width, startA + width])
+        startB = np.concatenate([startB, startB + width, startB, startB + width])
+
+    return segA, startA + 0.5 * width, segB, startB + 0.5 * width
+
+
+def _point_pairs(nodesA, nodesB, ua, ub):
+    return np.einsum('nk,nkd->nd', bernstein_basis(ua), nodesA) - np.einsum('nk,nkd->nd', bernstein_basis(ub), nodesB)
+
+
+def _newton_refine(nodesA, nodesB, ua, ub, iterations, backtracks=2):
+    """ Newton on |A(u) - B(v)|^2 with analytic first and second derivatives, per seed.
+
+    A parameter sitting on 0 or 1 with its gradient pointing out of the
+    segment is held there and Newton runs on the other one alone, so minima
+    on a bound are found instead of clipped 2-D steps dragging both off. A
+    step (halved up to backtracks times) is only taken when it lowers the
+    squared distance, otherwise the seed stays put, which also keeps Newton
+    from climbing onto saddles.
+    """
+    ua = np.array(ua, dtype=np.float64)
+    ub = np.array(ub, dtype=np.float64)
+    diff = _point_pairs(nodesA, nodesB, ua, ub)
+    squared = np.einsum('nd,nd->n', diff, diff)
+    for _ in range(iterations):
+        stats.count("newton evaluations", len(ua))
+        da = bezier_derivative(nodesA, ua)
+        db = bezier_derivative(nodesB, ub)
+        dda = bezier_second_derivative(nodesA, ua)
+        ddb = bezier_second_derivative(nodesB, ub)
+
+        ga = np.einsum('nd,nd->n', diff, da)
+        gb = -np.einsum('nd,nd->n', diff, db)
+        haa = np.einsum('nd,nd->n', da, da) + np.einsum('nd,nd->n', diff, dda)
+        hbb = np.einsum('nd,nd->n', db, db) - np.einsum('nd,nd->n', diff, ddb)
+        hab = -np.einsum('nd,nd->n', da, db)
+
+        # descent moves against the gradient, which is out of the segment here
+        held_a = ((ua <= 0.0) & (ga > 0.0)) | ((ua >= 1.0) & (ga < 0.0))
+        held_b = ((ub <= 0.0) & (gb > 0.0)) | ((ub >= 1.0) & (gb < 0.0))
+
+        det = haa * hbb - hab * hab
+        both = ~held_a & ~held_b & (np.abs(det) > 1e-18)
+        only_a = ~held_a & held_b & (np.abs(haa) > 1e-18)
+        only_b = held_a & ~held_b & (np.abs(hbb) > 1e-18)
+        safe = np.where(both, det, 1.0)
+        step_a = np.where(both, (hbb * ga - hab * gb) / safe, 0.0)
+        step_b = np.where(both, (haa * gb - hab * ga) / safe, 0.0)
+        step_a = np.where(only_a, ga / np.where(only_a, haa, 1.0), step_a)
+        step_b = np.where(only_b, gb / np.where(only_b, hbb, 1.0), step_b)
+
+        pending = np.abs(step_a) + np.abs(step_b) >= 1e-15
+        if not np.any(pending):
+            break
+        moved = False
+        for _ in range(backtracks + 1):
+            index = np.flatnonzero(pending)
+            next_a = np.clip(ua[index] - step_a[index], 0.0, 1.0)
+            next_b = np.clip(ub[index] - step_b[index], 0.0, 1.0)
+            next_diff = _point_pairs(nodesA[index], nodesB[index], next_a, next_b)
+            next_squared = np.einsum('nd,nd->n', next_diff, next_diff)
+            better = next_squared < squared[index]
+            accepted = index[better]
+            ua[accepted], ub[accepted] = next_a[better], next_b[better]
+            diff[accepted], squared[accepted] = next_diff[better], next_squared[better]
+            moved = moved or len(accepted) > 0
+
+            pending[accepted] = False
+            if not np.any(pending):
+                break
+            step_a *= 0.5
+            step_b *= 0.5
+        if not moved:
+            break
+    return ua, ub
+
+
+def _solve(curveA, curveB, tolerance, closest, max_depth=32, max_pairs=4096, newton_iterations=8):
+    stats.count("intersection solves")
+    segA, ua, segB, ub = _subdivide(curveA, curveB, tolerance, closest, max_depth, max_pairs)
+    if len(segA) == 0:
+        return []
+    return _polish_seeds(curveA, curveB, segA, ua, segB, ub, tolerance, closest, newton_iterations)
+
+
+def _polish_seeds(curveA, curveB, segA, ua, segB, ub, tolerance, closest, newton_iterations=8):
+    """ Newton polish (segment, local parameter) seed pairs into distinct crossings, tightest first. """
+    nodesA = curveA.segments[segA] + curveA.location
+    nodesB = curveB.segments[segB] + curveB.location
+    ua, ub = _newton_refine(nodesA, nodesB, ua, ub, newton_iterations)
+
+    pointsA = np.einsum('nk,nkd->nd', bernstein_basis(ua), nodesA)
+    pointsB = np.einsum('nk,nkd->nd', bernstein_basis(ub), nodesB)
+    distances = np.linalg.norm(pointsA - pointsB, axis=-1)
+    ts = curveA.parameter_at(segA, ua)
+    ss = curveB.parameter_at(segB, ub)
+
+    # seeds from neighbouring boxes converge onto the same crossing, keep one of each
+    merge_distance = max(tolerance, 1e-9) * 10.0
+    crossings = []
+    for i in np.argsort(distances):
+        if not closest and distances[i] > tolerance:
+            break
+        point = 0.5 * (pointsA[i] + pointsB[i])
+        if any(np.linalg.norm(point - found.point) <= merge_distance for found in crossings):
+            continue
+        crossings.append(CurveIntersection(ts[i], ss[i], distances[i], point))
+        if closest:
+            break
+    return crossings
+
+
+def intersect_composite_curves(curveA: CompositeBezier, curveB: CompositeBezier, tolerance=1e-4):
+    """ Find every crossing of two composite curves.
+
+    Segment pairs are pruned by control polygon bounding boxes and subdivided
+    until the boxes are within tolerance, then every surviving seed is polished
+    with Newton steps on the squared distance.
+
+    Returns:
+        list of CurveIntersection sorted by distance, all within tolerance.
+    """
+    return _solve(curveA, curveB, tolerance, closest=False)
+
+
+def closest_approach(curveA: CompositeBezier, curveB: CompositeBezier, tolerance=1e-6):
+    """ The single closest pair of points between two composite curves, crossing or not. """
+    crossings = _solve(curveA, curveB, tolerance, closest=True)
+    return crossings[0] if crossings else None
+
+
+def refine_crossings(curveA: CompositeBezier, curveB: CompositeBezier, ts, ss, tolerance=1e-4, rounds=4):
+    """ Crossings polished from global (t, s) guesses, e.g. last run's solution.
+
+    Newton runs inside a segment; after each round a guess stuck at the end
+    of its segment moves on into the neighbouring one, so a crossing that
+    moved over segment boundaries is followed for up to rounds segments.
+
+    Returns:
+        list of CurveIntersection within tolerance, tightest first.
+    """
+    ts = np.clip(np.asarray(ts, dtype=np.float64).ravel(), 0.0, 1.0)
+    ss = np.clip(np.asarray(ss, dtype=np.float64).ravel(), 0.0, 1.0)
+    if len(ts) == 0 or curveA.segment_count == 0 or curveB.segment_count == 0:
+        return []
+    nodesA = curveA.segments + curveA.location
+    nodesB = curveB.segments + curveB.location
+    segA, ua = curveA.locate_many(ts)
+    segB, ub = curveB.locate_many(ss)
+    for _ in range(rounds - 1):
+        ua, ub = _newton_refine(nodesA[segA], nodesB[segB], ua, ub, 8)
+        segA, ua = _cross_segment_ends(segA, ua, curveA.segment_count)
+        segB, ub = _cross_segment_ends(segB, ub, curveB.segment_count)
+    return _polish_seeds(curveA, curveB, segA, ua, segB, ub, tolerance, closest=False)
+
+
+def _cross_segment_ends(segments, us, segment_count):
+    """ Move parameters clamped to the end (start) of a segment to the start (end) of the next (previous) one. """
+    forward = (us >= 1.0) & (segments < segment_count - 1)
+    backward = (us <= 0.0) & (segments > 0)
+    segments = segments + forward - backward
+    us = np.where(forward, 0.0, np.where(backward, 1.0, us))
+    return segments, us
+
+
+def coarse_grid_seeds(curveA: CompositeBezier, curveB: CompositeBezier, samples=None, count=4):
+    """ Global (ts, ss) at the local minima of the distance between coarse samplings of two curves.
+
+    Both curves are sampled evenly, by default twice per segment of the
+    longer chain (32 to 256 samples), and every sample pair is compared in one
+    (samples, samples) distance grid. Up to count of its local minima,
+    closest first, come back as Newton seeds.
+    """
+    if samples is None:
+        samples = int(np.clip(2 * max(curveA.segment_count, curveB.segment_count) + 1, 32, 256))
+    grid = np.linspace(0.0, 1.0, samples)
+    pointsA = curveA.evaluate_many(grid) + curveA.location
+    pointsB = curveB.evaluate_many(grid) + curveB.location
+    distances = np.sum((pointsA[:, None, :] - pointsB[None, :, :]) ** 2, axis=-1)
+
+    padded = np.pad(distances, 1, constant_values=np.inf)
+    minima = np.ones_like(distances, dtype=bool)
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if di or dj:
+                minima &= distances <= padded[1 + di:1 + di + samples, 1 + dj:1 + dj + samples]
+    rows, columns = np.nonzero(minima)
+    best = np.argsort(distances[rows, columns], kind='stable')[:count]
+    return grid[rows[best]], grid[columns[best]]
+
+
+def seed_corner(curveA: CompositeBezier, curveB: CompositeBezier, tolerance=1e-4):
+    """ Quick find_corner from coarse grid seeds, None when no seed converges onto a crossing. """
+    crossings = refine_crossings(curveA, curveB, *coarse_grid_seeds(curveA, curveB), tolerance)
+    return crossings[0] if crossings else None
+
+
+def find_corner(curveA: CompositeBezier, curveB: CompositeBezier, tolerance=1e-4):
+    """ The crossing used as a section corner: the tightest crossing, or the closest approach. """
+    crossings = intersect_composite_curves(curveA, curveB, tolerance)
+    if crossings:
+        return crossings[0]
+    return closest_approach(curveA, curveB)
+
+
+INTERSECTION_CACHE_VERSION = 1
+
+
+def _curve_key(curve):
+    """ Table key of a curve: its name, or for a curve built without one its content hash. """
+    return curve.name if curve.name is not None else "#" + curve.hash
+
+
+def _swapped(result):
+    if isinstance(result, list):
+        return [intersection.swapped() for intersection in result]
+    return result.swapped()
+
+
+class IntersectionTable:
+    """ Memoized corner intersections shared by every section of a run.
+
+    Entries are keyed by the unordered pair of curve names (content hashes
+    for curves built without a name) and remember the control point hash of
+    both curves, so a pair is solved once and solved again only when one of
+    its curves is edited.
+
+    solver(curveA, curveB, tolerance) computes an entry: find_corner by
+    default, or e.g. intersect_composite_curves to keep every crossing.
+
+    An edited pair is first warm started from its previous solution. A pair
+    seen for the first time is, with the default solver, tried from coarse
+    grid seeds before the full solve. save() and load() keep the table on
+    disk between runs.
+    """
+
+    def __init__(self, tolerance=1e-4, solver=None):
+        self.tolerance = tolerance
+        self.solver = find_corner if solver is None else solver
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, curveA: CompositeBezier, curveB: CompositeBezier):
+        """ Corner intersection with t on curveA and s on curveB, solved at most once per pair. """
+        keyA, keyB = _curve_key(curveA), _curve_key(curveB)
+        swap = keyA > keyB
+        first, second = (curveB, curveA) if swap else (curveA, curveB)
+        key = (keyB, keyA) if swap else (keyA, keyB)
+        hashes = (first.hash, second.hash)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == hashes:
+            self.hits += 1
+            stats.count("corner cache hits")
+            intersection = entry[1]
+        else:
+            self.misses += 1
+            with stats.stage("intersections"):
+                intersection = None
+                if entry is not None:
+                    intersection = self._warm_start(first, second, entry[1])
+                if intersection is None and self.solver is find_corner:
+                    intersection = seed_corner(first, second, self.tolerance)
+                    if intersection is not None:
+                        stats.count("seeded solves")
+                if intersection is None:
+                    intersection = self.solver(first, second, self.tolerance)
+            self._entries[key] = (hashes, intersection)
+
+        return _swapped(intersection) if swap else intersection
+
+    def _warm_start(self, curveA, curveB, previous):
+        """ Follow the previous solution of an edited pair, None unless every crossing is found again. """
+        crossings = previous if isinstance(previous, list) else [previous]
+        if not crossings:
+            return None
+        found = refine_crossings(curveA, curveB, [c.t for c in crossings], [c.s for c in crossings], self.tolerance)
+        if len(found) != len(crossings):
+            return None
+        stats.count("warm starts")
+        return found if isinstance(previous, list) else found[0]
+
+    def save(self, path):
+        """ Write every entry, with its curve hashes, to a json file. """
+        def crossing_json(intersection):
+            return {"t": intersection.t, "s": intersection.s, "distance": intersection.distance,
+                    "point": [float(v) for v in intersection.point]}
+
+        entries = []
+        for (nameA, nameB), (hashes, result) in sorted(self._entries.items()):
+            many = isinstance(result, list)
+            entries.append({"curves": [nameA, nameB], "hashes": list(hashes), "many": many,
+                            "crossings": [crossing_json(c) for c in (result if many else [result])]})
+        with open(path, "w") as f:
+            json.dump({"version": INTERSECTION_CACHE_VERSION, "solver": self.solver.__name__,
+                       "tolerance": self.tolerance, "entries": entries}, f, indent=1)
+
+    def load(self, path):
+        """ Merge entries saved by save(), if the file exists and was made with this solver and tolerance.
+
+        Returns:
+            The number of entries loaded.
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+        if (data.get("version") != INTERSECTION_CACHE_VERSION or data.get("solver") != self.solver.__name__
+                or data.get("tolerance") != self.tolerance):
+            return 0
+        for entry in data["entries"]:
+            crossings = [CurveIntersection(c["t"], c["s"], c["distance"], c["point"]) for c in entry["crossings"]]
+            result = crossings if entry["many"] else crossings[0]
+            self._entries[tuple(entry["curves"])] = (tuple(entry["hashes"]), result)
+        return len(data["entries"])
+
+    def lookup(self, nameA, nameB):
+        """ Cached intersection for two curve names (t on nameA), or None if never solved. """
+        swap = nameA > nameB
+        entry = self._entries.get((nameB, nameA) if swap else (nameA, nameB))
+        if entry is None:
+            return None
+        return _swapped(entry[1]) if swap else entry[1]
+
+    def entries(self):
+        """ (nameA, nameB, intersection) for every cached pair, for diagnostics. """
+        return [(nameA, nameB, entry[1]) for (nameA, nameB), entry in sorted(self._entries.items())]
+
+    def report(self):
+        lines = [f"{len(self)} curve pairs, {self.hits} hits, {self.misses} solves"]
+        for nameA, nameB, result in self.entries():
+            for intersection in (result if isinstance(result, list) else [result]):
+                lines.append(f"  {nameA} x {nameB}: t = {intersection.t:.6f}, s = {intersection.s:.6f}, distance = {intersection.distance:.6g}")
+        return "\n".join(lines)
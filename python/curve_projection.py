@@ -0,0 +1,184 @@
+import weakref
+
+import numpy as np
+
+from composite_bezier import CompositeBezier, basis_matrix, bernstein_basis, bezier_derivative, bezier_second_derivative
+from pipeline_stats import stats
+
+
+# Samples per segment used to seed Newton (and to bound distances from above), end points included
+SEED_SAMPLES = 9
+_SEED_TS = np.linspace(0.0, 1.0, SEED_SAMPLES)
+
+
+def _box_distance(lo, hi, points):
+    """ Distance from points to axis aligned boxes, all broadcast against each other. """
+    return np.linalg.norm(np.maximum(np.maximum(lo - points, points - hi), 0.0), axis=-1)
+
+
+class SegmentBVH:
+    """ Bounding volume hierarchy over the segments of a CompositeBezier.
+
+    Every segment lies inside the box of its control polygon (convex hull
+    property), so a box further from a query point than a point already found
+    on the curve can be skipped with everything under it. Nodes are kept in
+    flat arrays and queries walk the tree for all points at once.
+    """
+
+    def __init__(self, curve: CompositeBezier, leaf_size=4):
+        self.curve = curve
+        self.leaf_size = leaf_size
+        segments = curve.segments
+        self.segment_lo = segments.min(axis=1)
+        self.segment_hi = segments.max(axis=1)
+
+        # order lists segment indices so that every leaf owns a contiguous run of it
+        self.order = np.arange(len(segments))
+        lo, hi, children, leaf_start, leaf_count = [], [], [], [], []
+
+        def build(start, stop):
+            node = len(lo)
+            run = self.order[start:stop]
+            lo.append(self.segment_lo[run].min(axis=0))
+            hi.append(self.segment_hi[run].max(axis=0))
+            children.append([-1, -1])
+            leaf_start.append(start)
+            leaf_count.append(stop - start)
+            if stop - start > leaf_size:
+                # median split along the longest axis of the node box
+                centres = 0.5 * (self.segment_lo[run] + self.segment_hi[run])
+                axis = int(np.argmax(hi[node] - lo[node]))
+                self.order[start:stop] = run[np.argsort(centres[:, axis], kind='stable')]
+                middle = (start + stop) // 2
+                children[node] = [build(start, middle), build(middle, stop)]
+                leaf_count[node] = 0
+            return node
+
+        if len(segments):
+            build(0, len(segments))
+        self.node_lo = np.array(lo).reshape(-1, 3)
+        self.node_hi = np.array(hi).reshape(-1, 3)
+        self.children = np.array(children, dtype=np.int64).reshape(-1, 2)
+        self.leaf_start = np.array(leaf_start, dtype=np.int64)
+        self.leaf_count = np.array(leaf_count, dtype=np.int64)
+
+    def _leaf_segments(self, leaves):
+        """ (leaf index per entry, segment index per entry) for every segment under leaves. """
+        counts = self.leaf_count[leaves]
+        owners = np.repeat(np.arange(len(leaves)), counts)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, self.order[self.leaf_start[leaves][owners] + offsets]
+
+    def _upper_bounds(self, points):
+        """ Distance from every point to some point on the curve, found by one greedy descent. """
+        nodes = np.zeros(len(points), dtype=np.int64)
+        while True:
+            inner = np.flatnonzero(self.children[nodes, 0] >= 0)
+            if len(inner) == 0:
+                break
+            left, right = self.children[nodes[inner]].T
+            p = points[inner]
+            nearer_left = _box_distance(self.node_lo[left], self.node_hi[left], p) <= \
+                _box_distance(self.node_lo[right], self.node_hi[right], p)
+            nodes[inner] = np.where(nearer_left, left, right)
+
+        owners, segments = self._leaf_segments(nodes)
+        samples = basis_matrix(_SEED_TS) @ self.curve.segments[segments]
+        distances = np.linalg.norm(samples - points[owners, None, :], axis=-1).min(axis=1)
+        bounds = np.full(len(points), np.inf)
+        np.minimum.at(bounds, owners, distances)
+        return bounds
+
+    def candidates(self, points):
+        """ (point index, segment index) pairs that may hold the closest point, everything else pruned. """
+        bounds = self._upper_bounds(points)
+        pair_points = np.arange(len(points))
+        pair_nodes = np.zeros(len(points), dtype=np.int64)
+        leaf_points, leaf_nodes = [], []
+        while len(pair_points):
+            near = _box_distance(self.node_lo[pair_nodes], self.node_hi[pair_nodes], points[pair_points]) <= bounds[pair_points]
+            pair_points, pair_nodes = pair_points[near], pair_nodes[near]
+            stats.count("bvh node tests", int(near.size))
+            leaf = self.children[pair_nodes, 0] < 0
+            leaf_points.append(pair_points[leaf])
+            leaf_nodes.append(pair_nodes[leaf])
+            pair_points = np.repeat(pair_points[~leaf], 2)
+            pair_nodes = self.children[pair_nodes[~leaf]].ravel()
+
+        leaf_points = np.concatenate(leaf_points)
+        owners, segments = self._leaf_segments(np.concatenate(leaf_nodes))
+        candidate_points = leaf_points[owners]
+        keep = _box_distance(self.segment_lo[segments], self.segment_hi[segments], points[candidate_points]) <= bounds[candidate_points]
+        return candidate_points[keep], segments[keep]
+
+    def closest_points(self, points, newton_iterations=8):
+        """ Exact closest points on the curve to every query point.
+
+        points is (N, 3) (or a single (3,) point) in object space, like
+        CompositeBezier.evaluate. Candidate segments are seeded from
+        SEED_SAMPLES samples each and polished with Newton on
+        |B(t) - p|^2, clamped to the segment.
+
+        Returns:
+            (global parameters t (N,), closest points (N, 3), distances (N,))
+        """
+        points = np.asarray(points, dtype=np.float64)
+        single = points.ndim == 1
+        points = points.reshape(-1, 3)
+        count = len(points)
+        if count == 0 or self.curve.segment_count == 0:
+            return np.zeros(count), np.full((count, 3), np.nan), np.full(count, np.inf)
+
+        owners, segment_indices = self.candidates(points)
+        nodes = self.curve.segments[segment_indices]
+        targets = points[owners]
+
+        # The seed samples tighten each point's bound, prune again before the Newton pass
+        sample_distances = np.sum((basis_matrix(_SEED_TS) @ nodes - targets[:, None, :]) ** 2, axis=-1)
+        seeds = np.argmin(sample_distances, axis=1)
+        bounds = np.full(count, np.inf)
+        np.minimum.at(bounds, owners, np.sqrt(sample_distances[np.arange(len(seeds)), seeds]))
+        keep = _box_distance(self.segment_lo[segment_indices], self.segment_hi[segment_indices], targets) <= bounds[owners]
+        owners, segment_indices, nodes, targets = owners[keep], segment_indices[keep], nodes[keep], targets[keep]
+        local_ts = _SEED_TS[seeds[keep]]
+        stats.count("projection candidates", len(owners))
+
+        for _ in range(newton_iterations):
+            offset = np.einsum('nk,nkd->nd', bernstein_basis(local_ts), nodes) - targets
+            first = bezier_derivative(nodes, local_ts)
+            second = bezier_second_derivative(nodes, local_ts)
+            gradient = np.sum(offset * first, axis=-1)
+            curvature = np.sum(first * first, axis=-1) + np.sum(offset * second, axis=-1)
+            step = np.divide(gradient, curvature, out=np.zeros_like(gradient), where=curvature > 1e-12)
+            local_ts = np.clip(local_ts - step, 0.0, 1.0)
+            if np.all(np.abs(step) < 1e-12):
+                break
+
+        closest = np.einsum('nk,nkd->nd', bernstein_basis(local_ts), nodes)
+        distances = np.linalg.norm(closest - targets, axis=-1)
+
+        # best candidate per query point
+        order = np.lexsort((distances, owners))
+        best = order[np.concatenate(([True], owners[order][1:] != owners[order][:-1]))]
+        ts = self.curve.parameter_at(segment_indices[best], local_ts[best])
+        result = (ts, closest[best], distances[best])
+        if single:
+            return float(result[0][0]), result[1][0], float(result[2][0])
+        return result
+
+
+# One hierarchy per compiled curve, dropped together with it when the curve is recompiled
+_bvh_cache = weakref.WeakKeyDictionary()
+
+
+def get_segment_bvh(curve: CompositeBezier):
+    bvh = _bvh_cache.get(curve)
+    if bvh is None:
+        with stats.stage("bvh build"):
+            bvh = _bvh_cache[curve] = SegmentBVH(curve)
+    return bvh
+
+
+def closest_points_on_curve(curve: CompositeBezier, points):
+    """ Project points (N, 3) onto a composite curve, see SegmentBVH.closest_points. """
+    return get_segment_bvh(curve).closest_points(points)
@@ -0,0 +1,147 @@
+import fnmatch
+import os
+
+import numpy as np
+
+
+SNAPSHOT_VERSION = 1
+
+
+def export_curve_snapshot(path, objects, pattern="GraphTest.*"):
+    """ Write the bezier splines of every curve object matching pattern into an .npz file.
+
+    Stores, per curve, the object location and, per spline, its point count,
+    plus every control point and both handles as float32 (what blender keeps).
+    objects is any iterable of curve objects, e.g. bpy.data.objects.
+
+    Returns:
+        The number of curves written.
+    """
+    names, locations, spline_curves, spline_counts = [], [], [], []
+    co, handle_left, handle_right = [], [], []
+
+    for obj in sorted(objects, key=lambda o: o.name):
+        if obj.type != 'CURVE' or not fnmatch.fnmatchcase(obj.name, pattern):
+            continue
+        curve_index = len(names)
+        names.append(obj.name)
+        locations.append((obj.location.x, obj.location.y, obj.location.z))
+
+        for spline in obj.data.splines:
+            if spline.type != 'BEZIER':
+                continue
+            count = len(spline.bezier_points)
+            spline_curves.append(curve_index)
+            spline_counts.append(count)
+            for attr, out in (("co", co), ("handle_left", handle_left), ("handle_right", handle_right)):
+                flat = np.empty(count * 3, dtype=np.float32)
+                spline.bezier_points.foreach_get(attr, flat)
+                out.append(flat.reshape(count, 3))
+
+    def stacked(arrays):
+        return np.concatenate(arrays) if arrays else np.empty((0, 3), dtype=np.float32)
+
+    np.savez(path,
+             version=np.int32(SNAPSHOT_VERSION),
+             names=np.array(names, dtype=str),
+             locations=np.array(locations, dtype=np.float64).reshape(-1, 3),
+             spline_curves=np.array(spline_curves, dtype=np.int32),
+             spline_counts=np.array(spline_counts, dtype=np.int32),
+             co=stacked(co),
+             handle_left=stacked(handle_left),
+             handle_right=stacked(handle_right))
+    return len(names)
+
+
+class SnapshotLocation:
+    """ Stands in for an object's mathutils.Vector location. """
+
+    def __init__(self, xyz):
+        self.x, self.y, self.z = (float(v) for v in xyz)
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.z)[index]
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array((self.x, self.y, self.z), dtype=dtype)
+
+
+class SnapshotBezierPoints:
+    """ Stands in for spline.bezier_points, just enough for foreach_get and len. """
+
+    def __init__(self, co, handle_left, handle_right):
+        self._arrays = {"co": co, "handle_left": handle_left, "handle_right": handle_right}
+
+    def __len__(self):
+        return len(self._arrays["co"])
+
+    def foreach_get(self, attr, out):
+        out[:] = self._arrays[attr].ravel()
+
+
+class SnapshotSpline:
+    type = 'BEZIER'
+
+    def __init__(self, co, handle_left, handle_right):
+        self.bezier_points = SnapshotBezierPoints(co, handle_left, handle_right)
+
+
+class SnapshotCurveData:
+    def __init__(self, splines):
+        self.splines = splines
+
+
+class SnapshotCurve:
+    """ A curve object loaded from a snapshot.
+
+    Exposes the part of bpy.types.Object the sampling, intersection and
+    sectioning code reads (name, location, data.splines[].bezier_points), so
+    it can be passed anywhere a blender curve object is expected.
+    """
+
+    type = 'CURVE'
+
+    def __init__(self, name, location, splines):
+        self.name = name
+        self.location = SnapshotLocation(location)
+        self.data = SnapshotCurveData(splines)
+
+
+def load_curve_snapshot(path):
+    """ Load a snapshot written by export_curve_snapshot, without importing bpy.
+
+    Returns:
+        dict of curve name -> SnapshotCurve, in name order.
+    """
+    with np.load(path) as snapshot:
+        if int(snapshot["version"]) != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported curve snapshot version {int(snapshot['version'])}")
+        names = snapshot["names"]
+        locations = snapshot["locations"]
+        spline_curves = snapshot["spline_curves"]
+        spline_counts = snapshot["spline_counts"]
+        co = snapshot["co"]
+        handle_left = snapshot["handle_left"]
+        handle_right = snapshot["handle_right"]
+
+    splines = [[] for _ in names]
+    starts = np.concatenate(([0], np.cumsum(spline_counts)))
+    for curve_index, start, end in zip(spline_curves, starts[:-1], starts[1:]):
+        splines[curve_index].append(SnapshotSpline(co[start:end], handle_left[start:end], handle_right[start:end]))
+
+    return {str(name): SnapshotCurve(str(name), location, curve_splines)
+            for name, location, curve_splines in zip(names, locations, splines)}
+
+
+if __name__ == "<run_path>":
+    import bpy
+
+    snapshot_path = os.path.join(os.path.dirname(bpy.data.filepath), "curves.npz")
+    count = export_curve_snapshot(snapshot_path, bpy.data.objects)
+    print(f"Wrote {count} curves to {snapshot_path}")
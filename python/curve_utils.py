@@ -1,146 +1,78 @@
-import bpy
+import fnmatch
+import os
 import numpy as np
-from scipy.optimize import minimize
-import bezier
-import mathutils
 import time
 
-from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableSet, Reversible, Set as AbstractSet, Sized
-
-def transform_points_from_BY_to_AZ(B : np.ndarray, Y : np.ndarray, A : np.ndarray, Z : np.ndarray, points : Iterable[np.ndarray]):
-    # Direction vectors
-    v1 = Y - B
-    v2 = Z - A
-
-    # Lengths of the segments
-    L1 = np.linalg.norm(v1)
-    L2 = np.linalg.norm(v2)
-
-    # Unit vectors
-    u1 = v1 / L1
-    u2 = v2 / L2
-
-    # Compute the cross product and dot product
-    cross_prod = np.cross(u1, u2)
-    dot_prod = np.dot(u1, u2)
-
-    # Skew-symmetric cross-product matrix
-    K = np.array([
-        [0, -cross_prod[2], cross_prod[1]],
-        [cross_prod[2], 0, -cross_prod[0]],
-        [-cross_prod[1], cross_prod[0], 0]
-    ])
-
-    # Rotation matrix using Rodrigues' rotation formula
-    I = np.eye(3)
-    R = I + K + K @ K * ((1 - dot_prod) / (np.linalg.norm(cross_prod) ** 2))
-
-
-    # Scaling factor
-    s = L2 / L1
+try:
+    import bpy
+except ImportError:
+    # Headless runs (benchmarks, CI) read curves from a snapshot instead
+    bpy = None
+
+from adaptive_tessellation import conform_shared_boundaries, refine_section_job
+from composite_bezier import get_composite_curve
+from curve_snapshot import load_curve_snapshot
+from curve_intersection import IntersectionTable
+from mesh_weld import weld_vertices
+from mesh_writer import write_mesh
+from pipeline_stats import stats
+from section_discovery import discover_sections
+from section_graph import get_section_graph, section_curve_names
+from section_pool import mesh_sections, mesh_sections_parallel, mesh_sections_streaming
+from section_surface import SectionJob, evaluate_section_job
 
-    # Combined rotation and scaling matrix
-    M = s * R
-
-    # Affine transformation matrix in homogeneous coordinates
-    affine_matrix = np.eye(4)
-    affine_matrix[:3, :3] = M
-    affine_matrix[:3, 3] = A - M @ B
-
-    transformed_points = []
-    for P in points:
-        # Convert P to homogeneous coordinates
-        P_homogeneous = np.append(P, 1)
+from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableSet, Reversible, Set as AbstractSet, Sized
 
-        # Apply the affine transformation
-        P_transformed_homogeneous = affine_matrix @ P_homogeneous
+# Gap (in blender units) under which two curves count as crossing
+INTERSECTION_TOLERANCE = 1e-4
 
-        # Convert back to Cartesian coordinates
-        P_transformed = P_transformed_homogeneous[:3]
+# Section vertices closer than this are merged into one shared vertex
+WELD_TOLERANCE = 1e-4
 
-        transformed_points.append(P_transformed)
+# Curves passing closer than this count as crossing when sections are discovered
+DISCOVERY_TOLERANCE = 1e-3
 
-    return transformed_points
-    
+# Corner intersections shared across every curve_section of this run
+corner_intersections = IntersectionTable(INTERSECTION_TOLERANCE)
 
 def sample_blender_curve(curve_obj, t):
-    spline_points = []
-    for spline in curve_obj.data.splines:
-        if spline.type == 'BEZIER' and len(spline.bezier_points) > len(spline_points):
-            spline_points = spline.bezier_points
-
-    # spline = curve_obj.data.splines[0]
-    # for check_spline in curve_obj.data.splines:
-    #     length = len(check_spline.bezier_points)
-    #     if check_spline.type == 'BEZIER' and length > 1:
-    #         spline = check_spline
-    #         break
-
-
-    # if spline.type == 'BEZIER':
-        # spline_points = spline.bezier_points
-    curve_segments = []
-    curve_lengths = []
-    total_length = 0
-    
-    for i in range(len(spline_points) - 1):
-    #for i in range(1):
-        spline_point_a = spline_points[i]
-        spline_point_b = spline_points[i + 1]
-
-        segment_nodes = []
-        segment_nodes.append([spline_point_a.co.x, spline_point_a.handle_right.x, spline_point_b.handle_left.x, spline_point_b.co.x])
-        segment_nodes.append([spline_point_a.co.y, spline_point_a.handle_right.y, spline_point_b.handle_left.y, spline_point_b.co.y])
-        segment_nodes.append([spline_point_a.co.z, spline_point_a.handle_right.z, spline_point_b.handle_left.z, spline_point_b.co.z])
-
-        curve_segment = bezier.Curve(np.asfortranarray(segment_nodes), degree=3)
-        curve_segments.append(curve_segment)
-        curve_length = curve_segment.length
-        curve_lengths.append(curve_length)
-        total_length += curve_length
-
+    return get_composite_curve(curve_obj).evaluate(t)
 
-    # Function to evaluate a point on the composite curve at parameter t
-    def evaluate_composite_curve(t):
-        assert 0.0 <= t <= 1.0, "Parameter t must be in [0, 1]"
-        target_length = t * total_length
-        accumulated_length = 0.0
+def sample_blender_curve_many(curve_obj, ts):
+    """ Sample the curve at an array of parameters, returns an (N, 3) array. """
+    return get_composite_curve(curve_obj).evaluate_many(ts)
 
-        for curve, length in zip(curve_segments, curve_lengths):
-            if accumulated_length + length >= target_length:
-                local_t = (target_length - accumulated_length) / length
-                point = curve.evaluate(local_t)
-                return point.flatten()
-            accumulated_length += length
 
-        # If t == 1.0, return the end point of the last curve
-        return curve_segments[len(curve_segments)-1].evaluate(1.0).flatten()
-
-    point = evaluate_composite_curve(t)
-    # print(f"Point on the composite curve at t={t}: {point}")
-
-    # curve_obj = bpy.context.active_object
-    return point
+# Curves loaded with use_curve_snapshot, looked up before the blender scene
+snapshot_curves = None
 
+def use_curve_snapshot(path):
+    """ Serve get_curve_object from a curve_snapshot file instead of bpy.data. """
+    global snapshot_curves
+    snapshot_curves = load_curve_snapshot(path)
+    return snapshot_curves
 
 def get_curve_object(curveID):
+    if snapshot_curves is not None:
+        return snapshot_curves.get(curveID)
     return bpy.data.objects.get(curveID)
 
-def get_curve_intersection(curveA, curveB):
-    # Initial guess for (t, s)
-    t_init, s_init = 0.5, 0.5
-
-    def distance_squared(params):
-        """ Function to minimize: Squared Euclidean distance between C1(t) and C2(s) """
-        t, s = params
-        posA = sample_blender_curve(curveA, t) + [curveA.location.x, curveA.location.y, curveA.location.z]
-        posB = sample_blender_curve(curveB, s) + [curveB.location.x, curveB.location.y, curveB.location.z]
-        return np.sum((posA - posB)**2)
+def get_curve_objects(pattern="GraphTest.*"):
+    """ Every curve object whose name matches pattern, from the snapshot when one is in use. """
+    objects = snapshot_curves.values() if snapshot_curves is not None else bpy.data.objects
+    return [obj for obj in objects if obj.type == 'CURVE' and fnmatch.fnmatchcase(obj.name, pattern)]
 
-    # Minimize distance_squared with constraints on t and s
-    result = minimize(distance_squared, x0=[t_init, s_init], bounds=[(0, 1), (0, 1)])
+def get_curve_intersection(curveA, curveB, intersections=None):
+    """ Crossing of two curve objects, as a CurveIntersection with t on curveA and s on curveB.
 
-    return result
+    When the curves cross more than once the tightest crossing wins. Curves that
+    only pass close to each other fall back to their closest approach. Results
+    are memoized in intersections (corner_intersections by default), so shared
+    corners are solved once.
+    """
+    if intersections is None:
+        intersections = corner_intersections
+    return intersections.get(get_composite_curve(curveA), get_composite_curve(curveB))
 
 def loop(x: float, min:float=0, max:float=1):
 	LocalMax = (max - min)
@@ -170,37 +102,24 @@ def inverse_lerp(a, b, v) -> float:
 
 
 def create_visualization(verts, edges, faces):
-    """ Create an object to visualize the closest points and a line connecting them. """
-    try:
-        mesh = bpy.data.meshes["TempMesh"]
-        bpy.data.meshes.remove(mesh)
-    except KeyError:
-        pass
-
-    mesh = bpy.data.meshes.new("TempMesh")
-    obj = bpy.data.objects.new("TempMeshObj", mesh)
-    bpy.context.collection.objects.link(obj)
-
-    mesh.from_pydata(verts, edges, faces)
-    mesh.update()
-    bpy.context.view_layer.objects.active = mesh
-    # bpy.ops.mesh.remove_doubles(5)
+    """ Write the points and faces into the reusable TempMeshObj preview object. """
+    obj = write_mesh(verts, faces, edges)
+    bpy.context.view_layer.objects.active = obj
     
 
 
-def get_curve_section_points(leftCurve, rightCurve, topCurve, bottomCurve):
-    sectionPoints = []
-
-    botLeftIntersection = get_curve_intersection(leftCurve, bottomCurve)
-    botRightIntersection = get_curve_intersection(rightCurve, bottomCurve)
-    topRightIntersection = get_curve_intersection(rightCurve, topCurve)
-    topLeftIntersection = get_curve_intersection(leftCurve, topCurve)
+def get_section_job(leftCurve, rightCurve, topCurve, bottomCurve, resolution=(15, 15), engine="rodrigues", intersections=None):
+    """ Solve a section's corners and pack it into a bpy free, picklable SectionJob. """
+    botLeftIntersection = get_curve_intersection(leftCurve, bottomCurve, intersections)
+    botRightIntersection = get_curve_intersection(rightCurve, bottomCurve, intersections)
+    topRightIntersection = get_curve_intersection(rightCurve, topCurve, intersections)
+    topLeftIntersection = get_curve_intersection(leftCurve, topCurve, intersections)
 
 
-    leftStartT, bottomStartT = botLeftIntersection.x
-    rightStartT, bottomEndT = botRightIntersection.x
-    rightEndT, topEndT = topRightIntersection.x
-    leftEndT, topStartT = topLeftIntersection.x
+    leftStartT, bottomStartT = botLeftIntersection.t, botLeftIntersection.s
+    rightStartT, bottomEndT = botRightIntersection.t, botRightIntersection.s
+    rightEndT, topEndT = topRightIntersection.t, topRightIntersection.s
+    leftEndT, topStartT = topLeftIntersection.t, topLeftIntersection.s
 
     # if leftStartT > leftEndT:
     #     leftEndT += 1
@@ -210,42 +129,25 @@ def get_curve_section_points(leftCurve, rightCurve, topCurve, bottomCurve):
     #     rightEndT += 1
     # if topStartT > topEndT:
     #     topEndT += 1
-    
-    # bpy.context.scene.cursor.location = blargPoints[0]
 
-    # blargPoints.append(sample_blender_curve(bottomCurve, lerp(bottomStartT, bottomEndT, .5)) + bottomCurve.location)
-    # blargPoints.append(sample_blender_curve(topCurve, lerp(topStartT, topEndT, .5)) + topCurve.location)
-    # blargPoints.append(sample_blender_curve(leftCurve, lerp(leftStartT, leftEndT, .5)) + leftCurve.location)
-    # blargPoints.append(sample_blender_curve(rightCurve, lerp(rightStartT, rightEndT, .5)) + rightCurve.location)
-    
-    for xVert in range(15):
-        xT = float(xVert) / 14
-        bottomT = lerp(bottomStartT, bottomEndT, xT)
-        bottomPosition = np.array(sample_blender_curve(bottomCurve, bottomT) + bottomCurve.location)
-        topT = lerp(topStartT, topEndT, xT)
-        topPosition = np.array(sample_blender_curve(topCurve, topT) + topCurve.location)
-
-        verticalVerts = []
-        for yVert in range(15):
-            yT = float(yVert) / 14
-            verticalPosition = None
-            
-            leftT = lerp(leftStartT, leftEndT, yT)
-            leftPosition = np.array(sample_blender_curve(leftCurve, leftT) + leftCurve.location)
-            rightT = lerp(rightStartT, rightEndT, yT)
-            rightPosition = np.array(sample_blender_curve(rightCurve, rightT) + rightCurve.location)
-
-            verticalPosition = lerp(leftPosition, rightPosition, xT)
-
-            verticalVerts.append(verticalPosition)
-
-        B, *_, Y = verticalVerts
-        A = bottomPosition
-        Z = topPosition
-        
-        transformedVerts = transform_points_from_BY_to_AZ(B, Y, A, Z, verticalVerts)
-        for vert in transformedVerts:
-            sectionPoints.append(vert)
+    return SectionJob(get_composite_curve(leftCurve), get_composite_curve(rightCurve),
+                      get_composite_curve(topCurve), get_composite_curve(bottomCurve),
+                      (leftStartT, leftEndT), (rightStartT, rightEndT),
+                      (topStartT, topEndT), (bottomStartT, bottomEndT),
+                      resolution, engine)
+
+
+def get_curve_section_points(leftCurve, rightCurve, topCurve, bottomCurve, resolution=(15, 15), out=None, engine="rodrigues"):
+    """ Grid of points spanning the four boundary curves of a section.
+
+    resolution is the (u, v) vertex count: u along bottom/top, v along left/right.
+    Points come back column by column as a (u * v, 3) array, written into out
+    when a preallocated buffer (e.g. PatchMesher.section_vertices) is given.
+    engine picks the surface: "rodrigues" bends blended columns onto the
+    bottom/top span, "coons" evaluates a bilinearly blended Coons patch.
+    """
+    job = get_section_job(leftCurve, rightCurve, topCurve, bottomCurve, resolution, engine)
+    sectionPoints = evaluate_section_job(job, out)
 
 
 
@@ -279,39 +181,19 @@ def get_curve_section_points(leftCurve, rightCurve, topCurve, bottomCurve):
 
     return sectionPoints
 
-def get_15x15_faces(blargPoints):
-    # Number of vertices along one dimension
-    grid_size = 15
-
-    # Initialize the list to store quads
-    quads = []
-
-    # Iterate over each cell in the grid
-    for i in range(grid_size - 1):
-        for j in range(grid_size - 1):
-            # Calculate the indices of the four corners of the current quad
-            top_left = i * grid_size + j
-            top_right = top_left + 1
-            bottom_left = top_left + grid_size
-            bottom_right = bottom_left + 1
-
-            # Append the quad as a tuple of indices
-            top_left += len(blargPoints) - (15*15)
-            top_right += len(blargPoints) - (15*15)
-            bottom_right += len(blargPoints) - (15*15)
-            bottom_left += len(blargPoints) - (15*15)
-            quads.append((top_left, top_right, bottom_right, bottom_left))
-    
-    return quads
-
 if __name__ == "<run_path>":
     
     class curve_section:
-        def __init__(self, leftCurve, rightCurve, topCurve, bottomCurve):
+        def __init__(self, leftCurve, rightCurve, topCurve, bottomCurve, resolution=(15, 15)):
             self.leftCurve = leftCurve
             self.rightCurve = rightCurve
             self.topCurve = topCurve
             self.bottomCurve = bottomCurve
+            self.resolution = resolution
+
+        def job(self, engine="rodrigues", intersections=None):
+            return get_section_job(self.leftCurve, self.rightCurve, self.topCurve, self.bottomCurve,
+                                   self.resolution, engine, intersections)
 
     curve_sections = [
         # # ## FRONT
@@ -350,15 +232,88 @@ if __name__ == "<run_path>":
         # curve_section(leftCurve = get_curve_object("GraphTest.028"), rightCurve = get_curve_object("GraphTest.010"), topCurve = get_curve_object("GraphTest.021"), bottomCurve = get_curve_object("GraphTest.020")),
     ]
 
-    blargPoints = []
-    blargFaces = []
-    for section in curve_sections:
-        blargPoints.extend(get_curve_section_points(section.leftCurve, section.rightCurve, section.topCurve, section.bottomCurve))
-        blargFaces.extend(get_15x15_faces(blargPoints))
-
-    print(len(blargPoints))
-
-    create_visualization(blargPoints, [], blargFaces)
+    # Find every four sided section from the crossings of the GraphTest curves instead of the list above
+    discover = False
+    if discover:
+        curve_sections = discover_sections(get_curve_objects(), DISCOVERY_TOLERANCE)
+        print(f"Discovered {len(curve_sections)} sections")
+
+    # "rodrigues" or "coons", see section_surface.SECTION_ENGINES
+    section_engine = "rodrigues"
+
+    # Print per section wall time and evaluation counters, cheap enough to leave on
+    profile = False
+    # pipeline_stats outlives a run like the section graph does, start every run from zero
+    stats.reset()
+    stats.enable(profile)
+    start = time.perf_counter()
+
+    # Mesh the sections on a process pool, corners are still solved here first
+    parallel = False
+
+    # Chord height (blender units) to tessellate to instead of each section's fixed resolution, None for uniform grids
+    adaptive_tolerance = None
+
+    # Directory to stream print resolution shells into as float32 vertices.npy / faces.npy memory maps,
+    # nothing is welded or uploaded to blender then. None keeps the shell in memory
+    stream_directory = None
+
+    mesh_jobs = parallel or adaptive_tolerance is not None or stream_directory is not None
+    if mesh_jobs:
+        intersections = corner_intersections
+    else:
+        # Kept between runs of this script, so only sections bounded by an edited curve are re-meshed
+        graph = get_section_graph("curve_utils", INTERSECTION_TOLERANCE)
+        intersections = graph.intersections
+
+    # Solved corners are kept next to the blend file, later runs reuse or warm start from them
+    intersection_cache = os.path.join(os.path.dirname(bpy.data.filepath), "intersections.json") if bpy and bpy.data.filepath else None
+    if intersection_cache and len(intersections) == 0:
+        print(f"Loaded {intersections.load(intersection_cache)} cached corner intersections")
+
+    if mesh_jobs:
+        jobs = []
+        for index, section in enumerate(curve_sections):
+            with stats.section(f"{index}: {' / '.join(section_curve_names(section))}"):
+                job = section.job(section_engine, intersections)
+                if adaptive_tolerance is not None:
+                    with stats.stage("adaptive refinement"):
+                        job = refine_section_job(job, adaptive_tolerance)
+                jobs.append(job)
+        if adaptive_tolerance is not None:
+            with stats.stage("conform boundaries"):
+                jobs = conform_shared_boundaries(jobs)
+        if stream_directory is not None:
+            mesher = mesh_sections_streaming(jobs, stream_directory)
+        elif parallel:
+            mesher = mesh_sections_parallel(jobs)
+        else:
+            mesher = mesh_sections(jobs)
+    else:
+        remeshed = graph.update(curve_sections, lambda section, engine: section.job(engine, intersections),
+                                section_engine)
+        mesher = graph.mesher
+        print(f"Re-meshed {len(remeshed)} of {len(curve_sections)} sections")
+
+    if stream_directory is not None:
+        print(f"Streamed {len(mesher.vertices)} vertices and {len(mesher.faces)} faces to {stream_directory}")
+    else:
+        # Neighbouring sections each emit the shared boundary, weld them into one shell
+        with stats.stage("weld"):
+            shellVerts, shellFaces, _ = weld_vertices(mesher.vertices, mesher.faces, WELD_TOLERANCE)
+
+        print(f"{len(mesher.vertices)} vertices, {len(shellVerts)} after welding")
+
+        with stats.stage("mesh upload"):
+            create_visualization(shellVerts, [], shellFaces)
+
+    print(intersections.report())
+    if intersection_cache:
+        intersections.save(intersection_cache)
+
+    if profile:
+        print(stats.report())
+    print(f"Meshed {len(curve_sections)} sections in {(time.perf_counter() - start) * 1000:.1f} ms")
 
 
 
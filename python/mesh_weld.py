@@ -0,0 +1,84 @@
+import itertools
+
+import numpy as np
+
+
+# The 27 cell offsets around (and including) a vertex's own cell
+_NEIGHBOUR_OFFSETS = np.array(list(itertools.product((-1, 0, 1), repeat=3)), dtype=np.int64)
+
+
+def weld_vertices(vertices, faces, tolerance=1e-4):
+    """ Merge vertices closer than tolerance and remap the faces onto the survivors.
+
+    Vertices are bucketed into a grid of tolerance sized cells. The first
+    vertex of each cell represents it, and every vertex snaps to the lowest
+    numbered representative within tolerance among the 27 surrounding cells.
+    All of it runs as whole array numpy passes, one per neighbour offset.
+    A face whose repeated corners sit next to each other (a collapsed side)
+    loses the repeats, e.g. a quad becomes a triangle, its row padded with -1
+    at the end. Faces left with fewer than three distinct corners, or folded
+    onto themselves, are dropped.
+
+    Returns:
+        (welded vertices (M, 3), remapped faces (F', k) padded with -1, remap (N,) old index -> new index)
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces, dtype=np.int64)
+    count = len(vertices)
+    if count == 0:
+        return vertices.copy(), faces.astype(np.int32), np.empty(0, dtype=np.int64)
+
+    cells = np.floor(vertices / tolerance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    if np.prod(dims.astype(np.float64)) >= 2.0 ** 62:
+        raise ValueError("Weld tolerance is too small for the extent of the mesh")
+
+    def cell_keys(c):
+        return (c[..., 0] * dims[1] + c[..., 1]) * dims[2] + c[..., 2]
+
+    keys = cell_keys(cells)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    first = np.ones(count, dtype=bool)
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    bucket_keys = sorted_keys[first]
+    # stable sort keeps the lowest vertex index first in every bucket
+    bucket_representatives = order[first]
+
+    remap = np.arange(count)
+    tolerance_squared = tolerance * tolerance
+    for offset in _NEIGHBOUR_OFFSETS:
+        neighbour_keys = cell_keys(cells + offset)
+        slots = np.minimum(np.searchsorted(bucket_keys, neighbour_keys), len(bucket_keys) - 1)
+        found = bucket_keys[slots] == neighbour_keys
+        candidates = bucket_representatives[slots]
+        close = found & (np.sum((vertices[candidates] - vertices) ** 2, axis=1) <= tolerance_squared)
+        remap = np.where(close & (candidates < remap), candidates, remap)
+
+    # follow chains (a -> b -> c) until every vertex points at a root
+    while True:
+        next_remap = remap[remap]
+        if np.array_equal(next_remap, remap):
+            break
+        remap = next_remap
+
+    kept, remap = np.unique(remap, return_inverse=True)
+    welded_vertices = vertices[kept]
+
+    welded_faces = remap[faces]
+    if len(welded_faces):
+        # a corner equal to the one before it is a collapsed side
+        repeated = welded_faces == np.roll(welded_faces, 1, axis=1)
+        remaining = welded_faces.shape[1] - np.count_nonzero(repeated, axis=1)
+        sorted_corners = np.sort(welded_faces, axis=1)
+        distinct = 1 + np.count_nonzero(sorted_corners[:, 1:] != sorted_corners[:, :-1], axis=1)
+        keep = (distinct >= 3) & (distinct == remaining)
+        welded_faces, repeated = welded_faces[keep], repeated[keep]
+        if repeated.any():
+            # move the surviving corners to the front, in order, and pad with -1
+            order = np.argsort(repeated, axis=1, kind='stable')
+            welded_faces = np.take_along_axis(welded_faces, order, axis=1)
+            welded_faces[np.take_along_axis(repeated, order, axis=1)] = -1
+
+    return welded_vertices, welded_faces.astype(np.int32), remap
@@ -0,0 +1,82 @@
+import hashlib
+
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    # Lets headless runs import the pipeline, writing a mesh still needs blender
+    bpy = None
+
+
+def _topology_hash(vertex_count, edges, faces):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.int64(vertex_count).tobytes())
+    digest.update(np.int64(faces.shape[1]).tobytes())
+    digest.update(edges.tobytes())
+    digest.update(faces.tobytes())
+    return digest.hexdigest()
+
+
+def write_mesh(verts, faces, edges=None, mesh_name="TempMesh", object_name="TempMeshObj"):
+    """ Write contiguous vertex and face arrays into a reusable mesh object.
+
+    verts is (N, 3) (passed through without a copy when already float32),
+    faces is (F, k) vertex indices, faces with fewer corners padded with -1
+    at the end (as weld_vertices leaves them), and edges an optional (E, 2) array. Everything is filled with
+    foreach_set. When the topology matches the last write only the vertex
+    coordinates are rewritten in place. The same datablock and object are
+    reused on every run instead of piling up copies.
+
+    Returns:
+        The mesh object.
+    """
+    verts = np.ascontiguousarray(verts, dtype=np.float32).reshape(-1, 3)
+    faces = np.ascontiguousarray(faces, dtype=np.int32)
+    if faces.size == 0:
+        faces = faces.reshape(0, 4)
+    edges = np.ascontiguousarray(edges if edges is not None and len(edges) else np.empty((0, 2)), dtype=np.int32).reshape(-1, 2)
+
+    mesh = bpy.data.meshes.get(mesh_name)
+    if mesh is None:
+        mesh = bpy.data.meshes.new(mesh_name)
+
+    obj = bpy.data.objects.get(object_name)
+    if obj is None:
+        obj = bpy.data.objects.new(object_name, mesh)
+        bpy.context.collection.objects.link(obj)
+    elif obj.data != mesh:
+        obj.data = mesh
+
+    topology = _topology_hash(len(verts), edges, faces)
+    if mesh.get("topology_hash") == topology and len(mesh.vertices) == len(verts):
+        mesh.vertices.foreach_set("co", verts.ravel())
+        mesh.update()
+        return obj
+
+    mesh.clear_geometry()
+
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.ravel())
+
+    if len(edges):
+        mesh.edges.add(len(edges))
+        mesh.edges.foreach_set("vertices", edges.ravel())
+
+    if len(faces):
+        used = faces >= 0
+        loop_totals = np.count_nonzero(used, axis=1).astype(np.int32)
+        loop_starts = np.zeros(len(faces), dtype=np.int32)
+        np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+        loops = faces[used]
+        mesh.loops.add(len(loops))
+        mesh.loops.foreach_set("vertex_index", loops)
+        mesh.polygons.add(len(faces))
+        mesh.polygons.foreach_set("loop_start", loop_starts)
+        # blender 4 derives loop_total from the next loop_start and makes it read only
+        if not bpy.types.MeshPolygon.bl_rna.properties["loop_total"].is_readonly:
+            mesh.polygons.foreach_set("loop_total", loop_totals)
+
+    mesh["topology_hash"] = topology
+    mesh.update(calc_edges=True)
+    return obj
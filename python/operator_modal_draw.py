@@ -1,65 +1,133 @@
 import bpy
 
+from composite_bezier import get_composite_curve
+from curve_utils import INTERSECTION_TOLERANCE, WELD_TOLERANCE, get_section_job
+from mesh_weld import weld_vertices
+from mesh_writer import write_mesh
+from section_graph import get_section_graph
+
 def curve_to_points_via_length(curve_obj_name, length):
-	
-	curve_obj = bpy.data.objects.get(curve_obj_name)
 	"""
 	Resamples the given curve object into points spaced by the specified segment length.
 
+	Works straight on the bezier control points, nothing is added to the scene
+	and the depsgraph is not evaluated.
+
 	Parameters:
-		curve_obj (bpy.types.Object): The curve object to resample.
-		segment_length (float): The desired length between resampled points.
+		curve_obj_name (str): Name of the curve object to resample.
+		length (float): The desired length between resampled points.
 
 	Returns:
-		list of mathutils.Vector: A list of vectors representing the resampled points.
+		np.ndarray: (N, 3) array of the resampled points in object space.
+	"""
+	curve_obj = bpy.data.objects.get(curve_obj_name)
+	return get_composite_curve(curve_obj).resample_by_length(length)
+
+
+class PreviewSection:
+	"""
+	A curve_section given by curve names. The curve objects are looked up
+	again on every access, so renamed or re-created curves are picked up.
 	"""
-	# Add a Geometry Nodes modifier
-	geo_mod = curve_obj.modifiers.new(name="ResampleCurve", type='NODES')
 
-	group = geo_mod.node_group = bpy.data.node_groups.new('ResampleCurveGroup', 'GeometryNodeTree')
+	def __init__(self, leftCurve, rightCurve, topCurve, bottomCurve, resolution=(15, 15)):
+		self.names = (leftCurve, rightCurve, topCurve, bottomCurve)
+		self.resolution = resolution
+
+	@property
+	def leftCurve(self):
+		return bpy.data.objects[self.names[0]]
+
+	@property
+	def rightCurve(self):
+		return bpy.data.objects[self.names[1]]
 
-	group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
-	input_node = group.nodes.new('NodeGroupInput')
-	input_node.select = False
-	input_node.location.x = -200 - input_node.width
+	@property
+	def topCurve(self):
+		return bpy.data.objects[self.names[2]]
 
-	group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
-	output_node = group.nodes.new('NodeGroupOutput')
-	output_node.is_active_output = True
-	output_node.select = False
-	output_node.location.x = 200
-	
-	group.links.new(group.nodes["Group Input"].outputs[0], group.nodes["Group Output"].inputs[0])
+	@property
+	def bottomCurve(self):
+		return bpy.data.objects[self.names[3]]
 
 
+# Sections the live preview keeps meshed, fill in before invoking the operator
+preview_sections = []
 
-	# Add a Resample Curve node
-	resample_node = group.nodes.new(type='GeometryNodeCurveToPoints')
-	resample_node.mode = 'LENGTH'  # Set mode to 'Length'
-	resample_node.inputs['Length'].default_value = 0.01  # Set desired length between points
 
+class CURVE_OT_live_shell_preview(bpy.types.Operator):
+	"""Re-mesh the shell sections whose boundary curves are edited, a few at a time, until Esc"""
+	bl_idname = "curve.live_shell_preview"
+	bl_label = "Live Shell Preview"
 
-	group.links.new(input_node.outputs[0], resample_node.inputs[0])  # Connect 'Geometry' output to 'Curve' input
-	group.links.new(resample_node.outputs[0], output_node.inputs[0])  # Connect 'Curve' output to 'Geometry' input
+	interval: bpy.props.FloatProperty(name="Interval", description="Seconds between ticks", default=1 / 30, min=0.001)
+	budget: bpy.props.FloatProperty(name="Budget", description="Seconds of meshing per tick", default=0.008, min=0.0)
+	engine: bpy.props.EnumProperty(name="Engine", items=[("rodrigues", "Rodrigues", ""), ("coons", "Coons", "")])
+	mesh_name: bpy.props.StringProperty(name="Mesh", default="ShellPreview")
 
-	# Apply the modifier to evaluate the geometry
-	bpy.context.view_layer.update()
+	_timer = None
 
-	# Access the evaluated mesh
-	depsgraph = bpy.context.evaluated_depsgraph_get()
-	eval_obj = curve_obj.evaluated_get(depsgraph)
-	mesh = eval_obj.to_mesh()
+	def invoke(self, context, event):
+		if not preview_sections:
+			self.report({'WARNING'}, "No preview_sections to mesh")
+			return {'CANCELLED'}
 
-	# Retrieve the sampled points
-	sampled_points = [v.co for v in mesh.vertices]
+		self._graph = get_section_graph("live_preview", INTERSECTION_TOLERANCE)
+		wm = context.window_manager
+		self._timer = wm.event_timer_add(self.interval, window=context.window)
+		wm.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
 
-	# Clean up
-	eval_obj.to_mesh_clear()
+	def modal(self, context, event):
+		if event.type == 'ESC':
+			self.cancel(context)
+			return {'FINISHED'}
 
-	curve_obj.modifiers.remove(geo_mod)
+		if event.type == 'TIMER':
+			try:
+				self.tick()
+			except Exception as error:
+				# e.g. a KeyError once a preview curve is renamed or deleted
+				self.report({'ERROR'}, f"Live shell preview stopped: {type(error).__name__}: {error}")
+				self.cancel(context)
+				return {'CANCELLED'}
 
-	return sampled_points
+		# Everything else goes on to the viewport, so curves stay editable while this runs
+		return {'PASS_THROUGH'}
 
+	def cancel(self, context):
+		"""
+		Remove the event timer, also called by blender when it ends the operator
+		itself (e.g. on closing the window or loading a file).
+		"""
+		if self._timer is not None:
+			context.window_manager.event_timer_remove(self._timer)
+			self._timer = None
+
+	def tick(self):
+		"""
+		Re-mesh dirty sections until the budget is spent and push the shell to
+		the preview mesh in place. Sections left over are done on the next tick.
+		"""
+		graph = self._graph
+		remeshed = graph.update(preview_sections, self.make_job, self.engine, self.budget)
+		if not remeshed:
+			return
+
+		shellVerts, shellFaces, _ = weld_vertices(graph.mesher.vertices, graph.mesher.faces, WELD_TOLERANCE)
+		write_mesh(shellVerts, shellFaces, mesh_name=self.mesh_name, object_name=self.mesh_name + "Obj")
+
+	def make_job(self, section, engine):
+		return get_section_job(section.leftCurve, section.rightCurve, section.topCurve, section.bottomCurve,
+							   section.resolution, engine, self._graph.intersections)
+
+
+def register():
+	bpy.utils.register_class(CURVE_OT_live_shell_preview)
+
+
+def unregister():
+	bpy.utils.unregister_class(CURVE_OT_live_shell_preview)
 
 
 if __name__ == "__main__":
@@ -67,3 +135,11 @@ if __name__ == "__main__":
 	test_points = curve_to_points_via_length("GraphTest.004", 0.5)
 	for point in test_points:
 		print(point)
+
+
+if __name__ == "<run_path>":
+	preview_sections[:] = [
+		PreviewSection("GraphTest.001", "GraphTest.002", "GraphTest.004", "GraphTest.007"),
+	]
+	register()
+	bpy.ops.curve.live_shell_preview('INVOKE_DEFAULT')
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+
+def grid_faces(u_count, v_count, base=0, start=0, stop=None):
+    """ Quad indices for a u_count x v_count vertex grid, built without python loops.
+
+    Vertices are laid out column by column: vertex (x, y) sits at
+    base + x * v_count + y. start and stop limit it to the quad columns
+    between grid lines start..stop, in the same order as the whole grid.
+    Returns an (F, 4) int32 array.
+    """
+    stop = u_count - 1 if stop is None else stop
+    x, y = np.meshgrid(np.arange(start, stop), np.arange(v_count - 1), indexing='ij')
+    top_left = (base + x * v_count + y).ravel()
+    top_right = top_left + 1
+    bottom_left = top_left + v_count
+    bottom_right = bottom_left + 1
+    return np.stack([top_left, top_right, bottom_right, bottom_left], axis=1).astype(np.int32)
+
+
+def _allocate(directory, name, shape, dtype):
+    shape = tuple(int(n) for n in shape)
+    if directory is None:
+        return np.zeros(shape, dtype=dtype)
+    # .npy backed, so the buffers can be opened again with np.load(mmap_mode="r")
+    return np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+", dtype=dtype, shape=shape)
+
+
+class PatchMesher:
+    """ Preallocated vertex and face buffers for a list of grid patches.
+
+    Every patch has its own (u, v) resolution. Vertex and face offsets are
+    fixed up front, so patches can be filled in any order and the face
+    indices never depend on what was meshed before.
+
+    With a directory the buffers are memory mapped vertices.npy and
+    faces.npy files in it instead of RAM, and faces are filled
+    rows_per_chunk quad columns at a time, so very high resolutions never
+    need the whole mesh in memory.
+    """
+
+    def __init__(self, resolutions, dtype=np.float64, directory=None, rows_per_chunk=256):
+        self.resolutions = [(int(u), int(v)) for u, v in resolutions]
+        vertex_counts = np.array([u * v for u, v in self.resolutions], dtype=np.int64)
+        face_counts = np.array([(u - 1) * (v - 1) for u, v in self.resolutions], dtype=np.int64)
+
+        self.vertex_offsets = np.concatenate(([0], np.cumsum(vertex_counts)))
+        self.face_offsets = np.concatenate(([0], np.cumsum(face_counts)))
+
+        self.vertices = _allocate(directory, "vertices", (self.vertex_offsets[-1], 3), dtype)
+        self.faces = _allocate(directory, "faces", (self.face_offsets[-1], 4), np.int32)
+        for i, (u, v) in enumerate(self.resolutions):
+            for start in range(0, u - 1, rows_per_chunk):
+                stop = min(start + rows_per_chunk, u - 1)
+                first = self.face_offsets[i] + start * (v - 1)
+                self.faces[first:first + (stop - start) * (v - 1)] = grid_faces(u, v, self.vertex_offsets[i], start, stop)
+
+    def __len__(self):
+        return len(self.resolutions)
+
+    def section_vertices(self, index):
+        """ Writable (u * v, 3) view of one patch's vertices. """
+        return self.vertices[self.vertex_offsets[index]:self.vertex_offsets[index + 1]]
+
+    def section_faces(self, index):
+        return self.faces[self.face_offsets[index]:self.face_offsets[index + 1]]
+
+    def write_section(self, index, points):
+        self.section_vertices(index)[:] = np.asarray(points).reshape(-1, 3)
+
+    def write_rows(self, index, start, points):
+        """ Write grid lines start.. of one patch, points is (rows * v, 3). """
+        v = self.resolutions[index][1]
+        first = self.vertex_offsets[index] + start * v
+        self.vertices[first:first + len(points)] = points
+
+    def flush(self):
+        """ Push memory mapped buffers to disk, a no-op for in-memory ones. """
+        for buffer in (self.vertices, self.faces):
+            if isinstance(buffer, np.memmap):
+                buffer.flush()
@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class PipelineStats:
+    """ Opt-in wall time and counters for the section pipeline.
+
+    Stages and counters are booked against the section currently being
+    meshed (see section()), or against "(setup)" outside of one, and
+    summed into a total. While disabled every call returns straight away,
+    so the hooks can stay in the hot paths.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.current = "(setup)"
+        self.sections = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.current = "(setup)"
+        self.sections = {}
+
+    def _entry(self):
+        entry = self.sections.get(self.current)
+        if entry is None:
+            entry = self.sections[self.current] = ({}, {})
+        return entry
+
+    @contextmanager
+    def section(self, label):
+        """ Book everything inside the with block against section label. """
+        previous = self.current
+        self.current = label
+        try:
+            yield
+        finally:
+            self.current = previous
+
+    def stage(self, name):
+        """ Context manager adding the wall time of its block to stage name. """
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            times = self._entry()[0]
+            times[name] = times.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        counts = self._entry()[1]
+        counts[name] = counts.get(name, 0) + amount
+
+    def totals(self):
+        """ (stage times, counters) summed over every section. """
+        times, counts = {}, {}
+        for section_times, section_counts in self.sections.values():
+            for name, value in section_times.items():
+                times[name] = times.get(name, 0.0) + value
+            for name, value in section_counts.items():
+                counts[name] = counts.get(name, 0) + value
+        return times, counts
+
+    def report(self):
+        def lines_for(label, times, counts):
+            lines = [label]
+            for name, seconds in sorted(times.items(), key=lambda item: -item[1]):
+                lines.append(f"    {name:24s} {seconds * 1000:10.3f} ms")
+            for name, value in sorted(counts.items()):
+                lines.append(f"    {name:24s} {value:10d}")
+            return lines
+
+        lines = []
+        for label, (times, counts) in self.sections.items():
+            lines.extend(lines_for(label, times, counts))
+        lines.extend(lines_for("TOTAL", *self.totals()))
+        return "\n".join(lines)
+
+
+# Shared by every module of the pipeline, off until enable() is called
+stats = PipelineStats()
@@ -0,0 +1,214 @@
+import numpy as np
+
+from composite_bezier import get_composite_curve
+from curve_intersection import IntersectionTable, intersect_composite_curves
+from pipeline_stats import stats
+from section_surface import SectionJob
+
+
+def curve_bounds(curves, padding=0.0):
+    """ World space (lo, hi) boxes of compiled curves, each (N, 3), grown by padding. """
+    lo = np.array([curve.segments.min(axis=(0, 1)) + curve.location for curve in curves]).reshape(-1, 3)
+    hi = np.array([curve.segments.max(axis=(0, 1)) + curve.location for curve in curves]).reshape(-1, 3)
+    return lo - padding, hi + padding
+
+
+def sweep_and_prune(lo, hi):
+    """ Index pairs (i, j), i < j, of overlapping boxes.
+
+    Boxes are sorted by their low x and swept once, testing each only against
+    the boxes whose x span is still open, so the cost is O(n log n) plus the
+    number of overlapping x spans rather than every pair.
+    """
+    pairs = []
+    active = []
+    for index in np.argsort(lo[:, 0], kind='stable'):
+        active = [other for other in active if hi[other, 0] >= lo[index, 0]]
+        if active:
+            others = np.array(active)
+            overlap = np.all((lo[others, 1:] <= hi[index, 1:]) & (hi[others, 1:] >= lo[index, 1:]), axis=1)
+            pairs.extend((min(other, index), max(other, index)) for other in others[overlap].tolist())
+        active.append(int(index))
+    return sorted(pairs)
+
+
+class CurveNetwork:
+    """ The graph of crossings between a set of curves.
+
+    Nodes are crossings, each between two curves at parameter t on the first
+    and s on the second. Along every curve its crossings are sorted by
+    parameter and consecutive ones are joined, so an edge is the piece of a
+    curve between two neighbouring crossings.
+    """
+
+    def __init__(self, curves, crossings):
+        self.curves = curves
+        # node -> (curve index, curve index), (parameter on each), world point
+        self.node_curves = []
+        self.node_parameters = []
+        self.node_points = []
+        for (i, j), found in sorted(crossings.items()):
+            for crossing in found:
+                self.node_curves.append((i, j))
+                self.node_parameters.append((crossing.t, crossing.s))
+                self.node_points.append(crossing.point)
+        self.node_points = np.array(self.node_points).reshape(-1, 3)
+
+        # curve index -> its nodes ordered along it
+        self.curve_nodes = {index: [] for index in range(len(curves))}
+        for node, curve_pair in enumerate(self.node_curves):
+            for curve in curve_pair:
+                self.curve_nodes[curve].append(node)
+        # (node, curve) -> index of node in curve_nodes[curve]
+        self.positions = {}
+        for curve, nodes in self.curve_nodes.items():
+            nodes.sort(key=lambda node: self.parameter(node, curve))
+            for position, node in enumerate(nodes):
+                self.positions[(node, curve)] = position
+
+    def parameter(self, node, curve):
+        i, j = self.node_curves[node]
+        return self.node_parameters[node][0 if curve == i else 1]
+
+    def other_curve(self, node, curve):
+        i, j = self.node_curves[node]
+        return j if curve == i else i
+
+    def neighbours(self, node, curve):
+        """ The nodes next to node along curve, before and after it. """
+        nodes = self.curve_nodes[curve]
+        position = self.positions[(node, curve)]
+        return nodes[max(position - 1, 0):position] + nodes[position + 1:position + 2]
+
+    def quads(self):
+        """ Every four sided face of the network, as (corner nodes, side curves).
+
+        A face is found from a corner n on curves P and Q: step to a neighbour
+        n1 along P (meeting curve R) and a neighbour n2 along Q (meeting S),
+        and it closes when R and S cross at a node next to n1 along R and next
+        to n2 along S. Corners come back as (n, n1, n3, n2) with sides
+        (P, R, S, Q) between consecutive corners.
+        """
+        found = {}
+        for node, (P, Q) in enumerate(self.node_curves):
+            for n1 in self.neighbours(node, P):
+                R = self.other_curve(n1, P)
+                for n2 in self.neighbours(node, Q):
+                    S = self.other_curve(n2, Q)
+                    if len({P, Q, R, S}) < 4:
+                        continue
+                    for n3 in self.neighbours(n1, R):
+                        if set(self.node_curves[n3]) == {R, S} and n3 in self.neighbours(n2, S):
+                            key = frozenset((node, n1, n2, n3))
+                            if key not in found:
+                                found[key] = ((node, n1, n3, n2), (P, R, S, Q))
+        return list(found.values())
+
+
+class DiscoveredSection:
+    """ A section found by discover_sections, usable wherever a curve_section is.
+
+    Besides the four boundary curve objects it carries the parameter range of
+    every boundary between its own corners, so curves crossing more than once
+    still get the right span.
+    """
+
+    def __init__(self, leftCurve, rightCurve, topCurve, bottomCurve, ranges, resolution=(15, 15)):
+        self.leftCurve = leftCurve
+        self.rightCurve = rightCurve
+        self.topCurve = topCurve
+        self.bottomCurve = bottomCurve
+        # (left, right, top, bottom) parameter ranges
+        self.ranges = ranges
+        self.resolution = resolution
+
+    def job(self, engine="rodrigues", intersections=None):
+        left_range, right_range, top_range, bottom_range = self.ranges
+        return SectionJob(get_composite_curve(self.leftCurve), get_composite_curve(self.rightCurve),
+                          get_composite_curve(self.topCurve), get_composite_curve(self.bottomCurve),
+                          left_range, right_range, top_range, bottom_range, self.resolution, engine)
+
+
+def _orient(network, objects, corners, sides, centroid, resolution):
+    """ Name the sides of a quad: top/bottom by height, left/right so the faces point away from centroid. """
+    points = network.node_points[list(corners)]
+    # sides[k] runs from corners[k] to corners[k + 1]; sides 0/2 and 1/3 face each other
+    midpoints = 0.5 * (points + np.roll(points, -1, axis=0))
+    if abs(midpoints[0, 2] - midpoints[2, 2]) >= abs(midpoints[1, 2] - midpoints[3, 2]):
+        bottom, top = (0, 2) if midpoints[0, 2] <= midpoints[2, 2] else (2, 0)
+    else:
+        bottom, top = (1, 3) if midpoints[1, 2] <= midpoints[3, 2] else (3, 1)
+    left, right = (bottom + 1) % 4, (bottom + 3) % 4
+
+    def corner(side_a, side_b):
+        """ The corner node where two adjacent sides meet. """
+        return corners[side_a] if (side_a - side_b) % 4 == 1 else corners[side_b]
+
+    def frame(left, right):
+        bottom_left, bottom_right, top_left = corner(left, bottom), corner(right, bottom), corner(left, top)
+        du = network.node_points[bottom_right] - network.node_points[bottom_left]
+        dv = network.node_points[top_left] - network.node_points[bottom_left]
+        # grid faces wind +v then +u, so their normal is dv x du
+        return np.dot(np.cross(dv, du), points.mean(axis=0) - centroid)
+
+    if frame(left, right) < 0.0:
+        left, right = right, left
+
+    def span(side, start_corner, end_corner):
+        curve = sides[side]
+        return (network.parameter(start_corner, curve), network.parameter(end_corner, curve))
+
+    bottom_left, bottom_right = corner(left, bottom), corner(right, bottom)
+    top_left, top_right = corner(left, top), corner(right, top)
+    ranges = (span(left, bottom_left, top_left), span(right, bottom_right, top_right),
+              span(top, top_left, top_right), span(bottom, bottom_left, bottom_right))
+    return DiscoveredSection(objects[sides[left]], objects[sides[right]], objects[sides[top]], objects[sides[bottom]],
+                             ranges, resolution)
+
+
+# Every crossing of every curve pair, kept between runs per tolerance
+_crossing_tables = {}
+
+
+def get_crossing_table(tolerance):
+    table = _crossing_tables.get(tolerance)
+    if table is None:
+        table = _crossing_tables[tolerance] = IntersectionTable(tolerance, solver=intersect_composite_curves)
+    return table
+
+
+def discover_sections(curve_objects, tolerance=1e-3, resolution=(15, 15), crossings=None):
+    """ Find every four sided section of a curve network, instead of listing them by hand.
+
+    Curve boxes are paired by sweep and prune, every overlapping pair is
+    solved for all its crossings (within tolerance, so near misses count),
+    and the four sided faces of the resulting crossing graph become sections.
+    crossings is an IntersectionTable keeping every crossing of a pair, by
+    default one kept between calls, so a rerun only solves edited pairs.
+
+    Returns:
+        list of DiscoveredSection, ordered by their boundary curve names.
+    """
+    objects = sorted(curve_objects, key=lambda obj: obj.name)
+    curves = [get_composite_curve(obj) for obj in objects]
+    if crossings is None:
+        crossings = get_crossing_table(tolerance)
+
+    with stats.stage("broad phase"):
+        pairs = sweep_and_prune(*curve_bounds(curves, tolerance))
+    stats.count("broad phase pairs", len(pairs))
+
+    found = {}
+    for i, j in pairs:
+        result = crossings.get(curves[i], curves[j])
+        if result:
+            found[(i, j)] = result
+
+    network = CurveNetwork(curves, found)
+    if len(network.node_points) == 0:
+        return []
+    centroid = network.node_points.mean(axis=0)
+    sections = [_orient(network, objects, corners, sides, centroid, resolution) for corners, sides in network.quads()]
+    sections.sort(key=lambda section: (section.leftCurve.name, section.rightCurve.name,
+                                       section.topCurve.name, section.bottomCurve.name))
+    return sections
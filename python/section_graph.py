@@ -0,0 +1,110 @@
+import time
+
+from composite_bezier import get_composite_curve
+from curve_intersection import IntersectionTable
+from patch_mesher import PatchMesher
+from pipeline_stats import stats
+from section_surface import evaluate_section_job
+
+
+def section_curve_names(section):
+    return (section.leftCurve.name, section.rightCurve.name, section.topCurve.name, section.bottomCurve.name)
+
+
+class SectionGraph:
+    """ Curve -> curve_section dependencies of a shell, for re-meshing only what changed.
+
+    Every section remembers the content hashes of its four boundary curves as
+    of its last meshing. On update() the hashes are compared against the
+    curves as they are now, and only sections with an edited boundary are
+    re-solved and re-meshed, straight into their slice of the shared vertex
+    buffer. Corner intersections are kept in the graph too, so corners between
+    untouched curves are never solved again.
+
+    The section layout (curve names, resolutions and surface engine) is the
+    buffer layout: when it changes the buffers are rebuilt and every section
+    meshed again.
+    """
+
+    def __init__(self, tolerance=1e-4):
+        self.intersections = IntersectionTable(tolerance)
+        self.layout = None
+        self.mesher = None
+        # curve name -> indices of the sections it bounds
+        self.curve_sections = {}
+        # per section, the hashes of (left, right, top, bottom) it was meshed from, None when never meshed
+        self.signatures = []
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def sections_using(self, curve_name):
+        return sorted(self.curve_sections.get(curve_name, ()))
+
+    def _set_layout(self, layout):
+        self.layout = layout
+        self.mesher = PatchMesher([resolution for _, resolution, _ in layout])
+        self.signatures = [None] * len(layout)
+        self.curve_sections = {}
+        for index, (names, _, _) in enumerate(layout):
+            for name in names:
+                self.curve_sections.setdefault(name, set()).add(index)
+
+    @staticmethod
+    def _signature(section, hashes):
+        """ Boundary hashes of a section, hashing each curve once per pass through hashes. """
+        signature = []
+        for curve in (section.leftCurve, section.rightCurve, section.topCurve, section.bottomCurve):
+            curve_hash = hashes.get(curve.name)
+            if curve_hash is None:
+                curve_hash = hashes[curve.name] = get_composite_curve(curve).hash
+            signature.append(curve_hash)
+        return tuple(signature)
+
+    def update(self, sections, make_job, engine="rodrigues", budget=None):
+        """ Bring the vertex buffer up to date with the curves of sections.
+
+        sections are curve_section like objects (leftCurve, rightCurve,
+        topCurve, bottomCurve, resolution). make_job(section, engine) returns
+        the SectionJob of one section, solving its corners in self.intersections.
+
+        With a budget (seconds) no new section is started once it is spent,
+        though at least one always is. Sections left over stay dirty and are
+        picked up by the next call.
+
+        Returns:
+            Indices of the sections that were re-meshed.
+        """
+        deadline = None if budget is None else time.perf_counter() + budget
+        layout = [(section_curve_names(section), tuple(section.resolution), engine) for section in sections]
+        if layout != self.layout:
+            self._set_layout(layout)
+
+        remeshed = []
+        hashes = {}
+        for index, section in enumerate(sections):
+            signature = self._signature(section, hashes)
+            if self.signatures[index] == signature:
+                continue
+            if remeshed and deadline is not None and time.perf_counter() >= deadline:
+                break
+            with stats.section(f"{index}: {' / '.join(layout[index][0])}"):
+                evaluate_section_job(make_job(section, engine), out=self.mesher.section_vertices(index))
+            self.signatures[index] = signature
+            remeshed.append(index)
+        return remeshed
+
+
+# Graphs outlive a single run of a script, so a rerun in the same blender session only re-meshes edits
+_section_graphs = {}
+
+
+def get_section_graph(name, tolerance=1e-4):
+    graph = _section_graphs.get(name)
+    if graph is None or graph.intersections.tolerance != tolerance:
+        graph = _section_graphs[name] = SectionGraph(tolerance)
+    return graph
+
+
+def clear_section_graphs():
+    _section_graphs.clear()
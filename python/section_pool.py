@@ -0,0 +1,67 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from patch_mesher import PatchMesher
+from pipeline_stats import stats
+from section_surface import evaluate_section_job, evaluate_section_rows
+
+
+def mesh_sections(jobs):
+    """ Mesh SectionJobs one after another into a PatchMesher, in job order. """
+    mesher = PatchMesher([job.resolution for job in jobs])
+    for i, job in enumerate(jobs):
+        evaluate_section_job(job, out=mesher.section_vertices(i))
+    return mesher
+
+
+def iter_section_chunks(jobs, rows_per_chunk=64):
+    """ Yield (section index, first grid line, points) for jobs, rows_per_chunk grid lines at a time. """
+    for index, job in enumerate(jobs):
+        u_count = job.resolution[0]
+        for start in range(0, u_count, rows_per_chunk):
+            points = evaluate_section_rows(job, start, min(start + rows_per_chunk, u_count))
+            stats.count("points emitted", len(points))
+            yield index, start, points
+
+
+def mesh_sections_streaming(jobs, directory=None, dtype=np.float32, rows_per_chunk=64):
+    """ Mesh SectionJobs chunk by chunk into preallocated, optionally memory mapped, buffers.
+
+    Only one chunk of rows_per_chunk grid lines is evaluated at a time and
+    written straight into the vertex buffer, so peak memory stays bounded by
+    the chunk size however high the resolution goes. With a directory the
+    buffers are vertices.npy and faces.npy memory maps in it (see PatchMesher).
+
+    Returns:
+        The filled PatchMesher.
+    """
+    mesher = PatchMesher([job.resolution for job in jobs], dtype, directory)
+    for index, start, points in iter_section_chunks(jobs, rows_per_chunk):
+        mesher.write_rows(index, start, points)
+    mesher.flush()
+    return mesher
+
+
+def mesh_sections_parallel(jobs, max_workers=None):
+    """ Mesh independent SectionJobs on a process pool.
+
+    Jobs only hold numpy control points and corner parameters, so they pickle
+    cleanly and the workers never touch bpy. Workers are spawned rather than
+    forked so Blender itself is not duplicated. Results are written back in
+    job order, so the vertex and face buffers match a serial run.
+
+    Returns:
+        A filled PatchMesher.
+    """
+    mesher = PatchMesher([job.resolution for job in jobs])
+    if not jobs:
+        return mesher
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        for i, points in enumerate(executor.map(evaluate_section_job, jobs)):
+            mesher.write_section(i, points)
+
+    return mesher
@@ -0,0 +1,133 @@
+import numpy as np
+
+from affine_transform import transform_points_from_BY_to_AZ
+from pipeline_stats import stats
+
+
+def lerp(a, b, t):
+    return (1 - t) * a + t * b
+
+
+def rodrigues_patch(bottom, top, left, right, us, vs):
+    """ Blend left to right per column, then bend every column onto its bottom/top span.
+
+    bottom and top are (U, 3) boundary points at us, left and right are (V, 3)
+    at vs. Returns a (U, V, 3) grid, column by column.
+    """
+    columns = lerp(left[None, :, :], right[None, :, :], us[:, None, None])
+    return transform_points_from_BY_to_AZ(columns[:, 0], columns[:, -1], bottom, top, columns)
+
+
+def coons_patch(bottom, top, left, right, us, vs):
+    """ Bilinearly blended Coons patch through four boundary curves.
+
+    S(u, v) = (1 - v) bottom(u) + v top(u) + (1 - u) left(v) + u right(v)
+              - bilinear blend of the four corners
+
+    Boundaries that only pass near each other share the average of their
+    end points as the corner. Returns a (U, V, 3) grid, column by column.
+    """
+    u = us[:, None, None]
+    v = vs[None, :, None]
+
+    corner00 = 0.5 * (bottom[0] + left[0])
+    corner10 = 0.5 * (bottom[-1] + right[0])
+    corner01 = 0.5 * (top[0] + left[-1])
+    corner11 = 0.5 * (top[-1] + right[-1])
+
+    ruled_v = (1 - v) * bottom[:, None, :] + v * top[:, None, :]
+    ruled_u = (1 - u) * left[None, :, :] + u * right[None, :, :]
+    bilinear = (1 - u) * ((1 - v) * corner00 + v * corner01) + u * ((1 - v) * corner10 + v * corner11)
+    return ruled_v + ruled_u - bilinear
+
+
+SECTION_ENGINES = {
+    "rodrigues": rodrigues_patch,
+    "coons": coons_patch,
+}
+
+
+def evaluate_section_surface(bottom, top, left, right, us, vs, engine="rodrigues"):
+    """ Evaluate a section grid from sampled boundaries with the named engine, (U * V, 3). """
+    try:
+        patch = SECTION_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown section engine {engine!r}, expected one of {sorted(SECTION_ENGINES)}")
+    us = np.asarray(us, dtype=np.float64)
+    vs = np.asarray(vs, dtype=np.float64)
+    with stats.stage(f"{engine} surface"):
+        return patch(bottom, top, left, right, us, vs).reshape(-1, 3)
+
+
+class SectionJob:
+    """ Everything needed to mesh one section without bpy, picklable for worker processes.
+
+    The four boundaries are compiled CompositeBezier curves and each *_range is
+    the (start, end) parameter span between the section's corner intersections.
+    us and vs optionally place the grid lines at explicit, increasing 0..1
+    parameters (e.g. from adaptive tessellation) instead of evenly, and then
+    set the resolution.
+    """
+
+    def __init__(self, left, right, top, bottom, left_range, right_range, top_range, bottom_range,
+                 resolution=(15, 15), engine="rodrigues", us=None, vs=None):
+        self.left = left
+        self.right = right
+        self.top = top
+        self.bottom = bottom
+        self.left_range = left_range
+        self.right_range = right_range
+        self.top_range = top_range
+        self.bottom_range = bottom_range
+        self.resolution = resolution
+        self.engine = engine
+        self.us = None if us is None else np.asarray(us, dtype=np.float64)
+        self.vs = None if vs is None else np.asarray(vs, dtype=np.float64)
+        if us is not None or vs is not None:
+            self.resolution = tuple(len(ts) for ts in section_parameters(self))
+
+
+def sample_boundary(curve, parameter_range, ts):
+    """ World space points on a boundary curve at ts spread over its parameter range. """
+    return curve.evaluate_many(lerp(parameter_range[0], parameter_range[1], ts)) + curve.location
+
+
+def section_parameters(job):
+    """ The (us, vs) grid line parameters of a SectionJob, even unless it carries its own. """
+    u_count, v_count = job.resolution
+    us = np.linspace(0.0, 1.0, u_count) if job.us is None else job.us
+    vs = np.linspace(0.0, 1.0, v_count) if job.vs is None else job.vs
+    return us, vs
+
+
+def evaluate_section_grid(job, us, vs):
+    """ Evaluate a SectionJob's surface at the grid us x vs, (len(us) * len(vs), 3). """
+    # Every row and column is sampled in one batch per curve instead of one call per point
+    with stats.stage("boundary sampling"):
+        bottom = sample_boundary(job.bottom, job.bottom_range, us)
+        top = sample_boundary(job.top, job.top_range, us)
+        left = sample_boundary(job.left, job.left_range, vs)
+        right = sample_boundary(job.right, job.right_range, vs)
+
+    return evaluate_section_surface(bottom, top, left, right, us, vs, job.engine)
+
+
+def evaluate_section_rows(job, start, stop):
+    """ Grid lines start:stop along u of a SectionJob, ((stop - start) * v, 3).
+
+    The u = 0 and u = 1 ends are evaluated along with the rows and dropped, so
+    engines that blend the section corners match a whole grid evaluation.
+    """
+    us, vs = section_parameters(job)
+    padded = np.concatenate(([us[0]], us[start:stop], [us[-1]]))
+    return evaluate_section_grid(job, padded, vs)[len(vs):-len(vs)]
+
+
+def evaluate_section_job(job, out=None):
+    """ Sample the boundaries of a SectionJob and evaluate its surface grid, (u * v, 3). """
+    points = evaluate_section_grid(job, *section_parameters(job))
+    stats.count("points emitted", len(points))
+    if out is not None:
+        out[:] = points
+        return out
+    return points